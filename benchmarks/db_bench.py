@@ -0,0 +1,92 @@
+"""
+Measure insert and lookup throughput of the tips database.
+
+Uses a throwaway SQLite file, so it never touches tips.db.
+
+    python benchmarks/db_bench.py --rows 1000000
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import click
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TIP_TYPES = ["python", "js", "trader", "blockchain"]
+TEXT = "*Level: #Basic* 🐍 Use enumerate() instead of range(len(items)) when you need the index. " * 4
+
+
+def timed(label, count, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    click.echo(f"{label:<40} {count / elapsed:12,.0f} ops/s  ({elapsed:.2f}s)")
+
+
+@click.command()
+@click.option("--rows", default=1_000_000, help="Rows to bulk insert into tips")
+@click.option("--single", default=2_000, help="Rows to insert one by one with create_tip")
+@click.option("--batch-size", default=10_000, help="Rows per batched insert")
+@click.option("--lookups", default=200, help="Repetitions of each lookup query")
+def main(rows, single, batch_size, lookups):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["TIPS_DATABASE_URL"] = "sqlite:///" + os.path.join(tmp, "bench.db")
+        import db
+        from sqlalchemy import func
+
+        db.get_engine()
+        click.echo(f"Database: {db.SQLALCHEMY_DATABASE_URL}")
+
+        def single_inserts():
+            for i in range(single):
+                db.create_tip(i, TIP_TYPES[i % 4], TEXT)
+
+        def batched_inserts():
+            for start in range(0, rows, batch_size):
+                db.create_tips([
+                    (i, TIP_TYPES[i % 4], TEXT)
+                    for i in range(start, min(start + batch_size, rows))
+                ])
+
+        def batched_similar_inserts():
+            for start in range(0, rows // 10, batch_size):
+                db.create_similar_tips([
+                    (i, TIP_TYPES[i % 4], TEXT)
+                    for i in range(start, min(start + batch_size, rows // 10))
+                ])
+
+        timed("create_tip (one row per commit)", single, single_inserts)
+        timed(f"create_tips (batches of {batch_size})", rows, batched_inserts)
+        timed(f"create_similar_tips (batches of {batch_size})", rows // 10, batched_similar_inserts)
+
+        since = datetime.now() - timedelta(minutes=5)
+
+        def query(build, repeat=lookups):
+            def run():
+                with db.session_scope() as session:
+                    for i in range(repeat):
+                        build(session, i).all()
+            return run
+
+        timed("latest 10 tips of a type", lookups, query(
+            lambda s, i: s.query(db.Tip).filter(db.Tip.type == TIP_TYPES[i % 4]).order_by(db.Tip.created_at.desc()).limit(10)
+        ))
+        timed("tips of a type in a time range", lookups, query(
+            lambda s, i: s.query(db.Tip.id).filter(db.Tip.type == TIP_TYPES[i % 4], db.Tip.created_at >= since).limit(100)
+        ))
+        timed("tip by faiss_index", lookups, query(
+            lambda s, i: s.query(db.Tip).filter(db.Tip.faiss_index == (i * 7919) % rows)
+        ))
+        aggregates = max(lookups // 20, 1)
+        timed("count per type", aggregates, query(
+            lambda s, i: s.query(db.Tip.type, func.count(db.Tip.id)).group_by(db.Tip.type), aggregates
+        ))
+        db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
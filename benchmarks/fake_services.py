@@ -0,0 +1,293 @@
+"""
+Local stand-ins for the OpenAI and Telegram Bot APIs, for benchmarks and offline runs.
+
+One HTTP server answers both:
+
+- POST /v1/chat/completions returns a tip, streamed word by word as server-sent events
+  when asked to. With probability --duplicate-rate the tip is a reworded repeat of an
+  earlier topic.
+- POST /v1/embeddings returns deterministic hashed embeddings. Rewordings of a topic
+  land close together, well above the 0.95 duplicate threshold.
+- POST /bot<token>/<method> answers getMe, sendMessage, editMessageText and the other
+  calls the bot makes. Updates queued with push_update are served by getUpdates, or
+  posted to the bot's webhook with post_update.
+
+Every request can be delayed by --latency seconds. To run the bot against it:
+
+    python benchmarks/fake_services.py --port 8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake \
+    TELEGRAM_BASE_URL=http://127.0.0.1:8765/bot python cli.py python
+"""
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import click
+import numpy as np
+
+WORDINGS = [
+    "Use {name} to write cleaner code",
+    "A quick trick: reach for {name} whenever you can",
+    "Did you know? {name} saves a lot of boilerplate",
+    "Stop reinventing things and let {name} do the work",
+]
+TOPIC_RE = re.compile(r"feature_(\d+)")
+# Spread of rewordings around their topic vector; keeps their cosine similarity near 0.999.
+TOPIC_NOISE = 0.03
+
+
+def _seeded(text: str) -> np.random.Generator:
+    return np.random.default_rng(int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little"))
+
+
+class FakeServices:
+    """A threaded HTTP server faking the OpenAI and Telegram APIs."""
+
+    def __init__(self, host="127.0.0.1", port=0, dimension=1536, latency=0.0, duplicate_rate=0.2, seed=0, token_delay=0.0):
+        self.dimension = dimension
+        self.latency = latency
+        # Seconds between the words of a streamed completion.
+        self.token_delay = token_delay
+        self.duplicate_rate = duplicate_rate
+        self.random = random.Random(seed)
+        self.topics = 0
+        self.message_id = 0
+        self.stats = {"chat": 0, "embeddings": 0, "embedded_texts": 0, "telegram": 0}
+        self._lock = threading.Lock()
+        # Updates waiting for getUpdates, and the time of the last message sent to each chat.
+        self.updates = []
+        self.update_id = 0
+        self._updates_ready = threading.Condition(self._lock)
+        self.sent_at = {}
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def new_tip(self) -> str:
+        with self._lock:
+            self.stats["chat"] += 1
+            if self.topics and self.random.random() < self.duplicate_rate:
+                topic = self.random.randrange(self.topics)
+            else:
+                topic = self.topics
+                self.topics += 1
+            wording = self.random.choice(WORDINGS)
+        name = f"feature_{topic}"
+        return (
+            "*Level: #Basic*\n"
+            f"*{wording.format(name=name)}* 🐍\n"
+            "```python\n"
+            f"from toolbox import {name}\n"
+            f"print({name}([1, 2, 3]))\n"
+            "```"
+        )
+
+    def embed(self, text: str) -> np.ndarray:
+        match = TOPIC_RE.search(text)
+        if match:
+            vector = _seeded(f"topic-{match.group(1)}").standard_normal(self.dimension)
+            vector += TOPIC_NOISE * _seeded(text).standard_normal(self.dimension)
+        else:
+            vector = _seeded(text).standard_normal(self.dimension)
+        return (vector / np.linalg.norm(vector)).astype("float32")
+
+    def make_update(self, text: str, chat_id: int, user_id: int) -> dict:
+        """Build the JSON of a private message update, as Telegram would send it."""
+        with self._lock:
+            self.update_id += 1
+            update_id = self.update_id
+        entities = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}] if text.startswith("/") else []
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private", "first_name": "Owner"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "Owner"},
+                "text": text,
+                "entities": entities,
+            },
+        }
+
+    def push_update(self, update: dict):
+        """Queue an update for the bot's next getUpdates call."""
+        with self._updates_ready:
+            self.updates.append(update)
+            self._updates_ready.notify_all()
+
+    def _get_updates(self, params: dict) -> list:
+        """Long-poll like Telegram: wait up to timeout seconds for updates from offset on."""
+        offset = int(params.get("offset") or 0)
+        deadline = time.monotonic() + float(params.get("timeout") or 0)
+        with self._updates_ready:
+            self.updates = [update for update in self.updates if update["update_id"] >= offset]
+            while not self.updates and time.monotonic() < deadline:
+                self._updates_ready.wait(deadline - time.monotonic())
+            return list(self.updates[:int(params.get("limit") or 100)])
+
+    def telegram(self, method: str, params: dict):
+        with self._lock:
+            self.stats["telegram"] += 1
+            self.message_id += 1
+            message_id = self.message_id
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        if method in ("sendMessage", "editMessageText"):
+            chat_id = params.get("chat_id", 0)
+            try:
+                chat_id = int(chat_id)
+            except (TypeError, ValueError):
+                chat_id = -1
+            with self._lock:
+                self.sent_at[chat_id] = time.perf_counter()
+            return {
+                "message_id": int(params.get("message_id", message_id)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "channel"},
+                "text": params.get("text", ""),
+            }
+        if method == "getUpdates":
+            return self._get_updates(params)
+        return True
+
+    def _handler_class(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _params(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if "json" in self.headers.get("Content-Type", ""):
+                    return json.loads(body or b"{}")
+                return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+
+            def _reply(self, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, model, content):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for piece in re.findall(r"\S+\s*", content):
+                    chunk = {
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(services.token_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def do_POST(self):
+                params = self._params()
+                if services.latency and not self.path.endswith("/getUpdates"):
+                    time.sleep(services.latency)
+                if self.path.endswith("/chat/completions") and params.get("stream"):
+                    self._stream(params.get("model", "fake"), services.new_tip())
+                elif self.path.endswith("/chat/completions"):
+                    self._reply({
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": params.get("model", "fake"),
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": services.new_tip()},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                    })
+                elif self.path.endswith("/embeddings"):
+                    texts = params["input"] if isinstance(params["input"], list) else [params["input"]]
+                    with services._lock:
+                        services.stats["embeddings"] += 1
+                        services.stats["embedded_texts"] += len(texts)
+                    vectors = [services.embed(text) for text in texts]
+                    if params.get("encoding_format") == "base64":
+                        vectors = [base64.b64encode(vector.tobytes()).decode() for vector in vectors]
+                    else:
+                        vectors = [vector.tolist() for vector in vectors]
+                    self._reply({
+                        "object": "list",
+                        "data": [{"object": "embedding", "index": i, "embedding": v} for i, v in enumerate(vectors)],
+                        "model": params.get("model", "fake"),
+                        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+                    })
+                elif self.path.startswith("/bot"):
+                    self._reply({"ok": True, "result": services.telegram(self.path.rsplit("/", 1)[-1], params)})
+                else:
+                    self.send_error(404)
+
+            do_GET = do_POST
+
+        return Handler
+
+
+def post_update(url: str, update: dict, secret_token: str = None, timeout: float = 10.0) -> int:
+    """
+    Deliver an update to a bot's webhook the way Telegram does.
+
+    Returns:
+        The HTTP status of the bot's reply
+    """
+    request = urllib.request.Request(url, data=json.dumps(update).encode(), method="POST")
+    request.add_header("Content-Type", "application/json")
+    if secret_token:
+        request.add_header("X-Telegram-Bot-Api-Secret-Token", secret_token)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1")
+@click.option("--port", default=8765)
+@click.option("--dimension", default=1536, help="Embedding dimension")
+@click.option("--latency", default=0.0, help="Seconds added to every request")
+@click.option("--duplicate-rate", default=0.2, help="Share of generated tips that repeat an earlier topic")
+@click.option("--token-delay", default=0.0, help="Seconds between the words of a streamed completion")
+def main(host, port, dimension, latency, duplicate_rate, token_delay):
+    services = FakeServices(host, port, dimension, latency, duplicate_rate, token_delay=token_delay)
+    click.echo(f"Fake OpenAI at {services.url}/v1 and Telegram at {services.url}/bot")
+    try:
+        services.server.serve_forever()
+    except KeyboardInterrupt:
+        services.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Track CLI cold-start time.
+
+Runs each target in a fresh interpreter several times and reports the median
+wall time, then uses `python -X importtime` to list the slowest imports.
+
+    python benchmarks/importtime.py --runs 5 --top 15
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import click
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "cli --help": [os.path.join(ROOT, "cli.py"), "--help"],
+    "import cli": ["-c", "import cli"],
+    "import bot": ["-c", "import bot"],
+    "import tips_provider": ["-c", "import services.tips_provider"],
+}
+
+
+def wall_time(args, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def slowest_imports(args, top):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    # Only report packages, not their submodules, which are included in the cumulative time.
+    rows = [row for row in rows if "." not in row[2]]
+    return sorted(rows, reverse=True)[:top]
+
+
+@click.command()
+@click.option("--runs", default=5, help="Fresh interpreter runs per target")
+@click.option("--top", default=10, help="Number of slowest imports to list")
+def main(runs, top):
+    python_startup = wall_time(["-c", "pass"], runs)
+    click.echo(f"{'interpreter startup':<22} {python_startup * 1000:8.1f} ms")
+    for name, args in TARGETS.items():
+        click.echo(f"{name:<22} {wall_time(args, runs) * 1000:8.1f} ms")
+
+    click.echo(f"\nSlowest imports for `{' '.join(TARGETS['import bot'])}`:")
+    for cumulative_us, self_us, name in slowest_imports(TARGETS["import bot"], top):
+        click.echo(f"{name.strip():<40} {cumulative_us / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
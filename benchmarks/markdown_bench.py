@@ -0,0 +1,105 @@
+"""
+Compare the MarkdownV2 formatter with the 18-pass escaper it replaced.
+
+Times both on a synthetic tip, then checks every stored Tip.text row:
+each formatted message must have balanced entities and keep its code
+blocks byte-for-byte (apart from the required backslash/backtick escapes).
+
+    python benchmarks/markdown_bench.py --iterations 20000
+"""
+import os
+import re
+import sys
+import timeit
+
+import click
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from services.markdown import escape_markdown, is_balanced  # noqa: E402
+
+SAMPLE_TIP = (
+    "*Level: #Advanced* 🚀\n"
+    "*Use functools.lru_cache to memoize pure functions!* 🧠\n"
+    "```python\n"
+    "from functools import lru_cache\n\n"
+    "@lru_cache(maxsize=None)\n"
+    "def fib(n: int) -> int:\n"
+    "    return n if n < 2 else fib(n - 1) + fib(n - 2)\n\n"
+    "print(fib(80))  # 23416728348467685 (instant!)\n"
+    "```"
+)
+
+_FENCE_RE = re.compile(r"```.*?```", re.DOTALL)
+
+
+def legacy_escape_markdown(text):
+    """The escaper used before the formatter, kept for comparison."""
+    text = text.replace("\\*", "*")
+    text = text.replace("\\`", "`")
+    for char in "_[]()~>#+-=|{}.!":
+        text = text.replace(char, f"\\{char}")
+    return text
+
+
+def code_preserved(text, message):
+    """Check that fenced code in the source survives formatting unchanged once unescaped."""
+    source_blocks = _FENCE_RE.findall(text)
+    sent_blocks = [
+        block.replace("\\`", "`").replace("\\\\", "\\")
+        for block in _FENCE_RE.findall(message)
+    ]
+    return source_blocks == sent_blocks[:len(source_blocks)]
+
+
+def check_corpus():
+    import db
+
+    total = legacy_unbalanced = unbalanced = code_changed = legacy_code_changed = 0
+    for batch in iter_all_tips(db):
+        for text in batch:
+            total += 1
+            message = escape_markdown(text)
+            legacy = legacy_escape_markdown(text)
+            unbalanced += not is_balanced(message)
+            legacy_unbalanced += not is_balanced(legacy)
+            code_changed += not code_preserved(text, message)
+            legacy_code_changed += not code_preserved(text, legacy)
+    click.echo(f"\nStored tips checked: {total}")
+    click.echo(f"{'':<22} {'formatter':>12} {'legacy':>12}")
+    click.echo(f"{'unbalanced entities':<22} {unbalanced:>12} {legacy_unbalanced:>12}")
+    click.echo(f"{'code blocks altered':<22} {code_changed:>12} {legacy_code_changed:>12}")
+    return unbalanced == 0 and code_changed == 0
+
+
+def iter_all_tips(db, batch_size=1000):
+    last_id = 0
+    while True:
+        with db.session_scope() as session:
+            rows = (
+                session.query(db.Tip.id, db.Tip.text)
+                .filter(db.Tip.id > last_id)
+                .order_by(db.Tip.id)
+                .limit(batch_size)
+                .all()
+            )
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield [text for _, text in rows if text]
+
+
+@click.command()
+@click.option("--iterations", default=20000, help="Calls per timing run")
+@click.option("--corpus/--no-corpus", default=True, help="Check all Tip.text rows in tips.db")
+def main(iterations, corpus):
+    for name, func in [("formatter", escape_markdown), ("legacy", legacy_escape_markdown)]:
+        seconds = min(timeit.repeat(lambda: func(SAMPLE_TIP), number=iterations, repeat=3))
+        click.echo(f"{name:<12} {seconds / iterations * 1e6:8.2f} us/call")
+    if corpus and not check_corpus():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+End-to-end benchmark of tip generation, deduplication and delivery without API keys.
+
+Runs against the local fakes in fake_services.py, with a throwaway database and index.
+For each index size it reports:
+
+- load time and resident memory
+- end-to-end tips/sec with p50/p99 latency of get_unique_tip plus sending
+- p50/p99 of a single duplicate-check search
+
+and fails if the index does not survive a save and memory-mapped reload.
+
+Telegram rate limits are lifted for the run so they do not mask the pipeline itself.
+
+    python benchmarks/pipeline_bench.py --sizes 1000,10000,100000,1000000 --tips 200
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import click
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeServices  # noqa: E402
+
+# Vectors preloaded into the index get IDs no Tip row will ever have.
+PRELOAD_ID_BASE = 1 << 41
+PRELOAD_CHUNK = 100_000
+
+
+def rss_mb():
+    """Current resident memory of this process in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def percentiles(samples):
+    return np.percentile(samples, 50) * 1000, np.percentile(samples, 99) * 1000
+
+
+def build_index(path, size, dimension, index_type, encoding, rng):
+    """Write an index of size random unit vectors, added in chunks to bound memory."""
+    import faiss
+    from services.index_factory import create_index, with_ids
+    from services.openai_client import EMBEDDING_MODEL
+    from services.vector_log import write_index_atomic
+
+    training = rng.standard_normal((min(size, 20_000), dimension), dtype="float32")
+    faiss.normalize_L2(training)
+    index = with_ids(create_index(index_type, dimension, training_vectors=training, encoding=encoding))
+    for start in range(0, size, PRELOAD_CHUNK):
+        count = min(PRELOAD_CHUNK, size - start)
+        vectors = rng.standard_normal((count, dimension), dtype="float32")
+        faiss.normalize_L2(vectors)
+        index.add_with_ids(vectors, np.arange(PRELOAD_ID_BASE + start, PRELOAD_ID_BASE + start + count))
+    write_index_atomic(index, path)
+    with open(f"{path}.dim", "w") as f:
+        f.write(f"{dimension}\n{EMBEDDING_MODEL}")
+
+
+async def run_size(size, tips, concurrency, searches, dimension, index_type, encoding, retry_delay, workdir):
+    import bot
+    from services.index_factory import read_index_mapped
+    from services.tips_provider import TipsProvider
+
+    rng = np.random.default_rng(size)
+    index_path = os.path.join(workdir, f"bench_{size}.faiss.index")
+    start = time.perf_counter()
+    build_index(index_path, size, dimension, index_type, encoding, rng)
+    build_time = time.perf_counter() - start
+
+    provider = TipsProvider(
+        index_path=index_path,
+        model="fake",
+        model_messages=[{"role": "user", "content": "Give me a tip."}],
+        tip_type=f"bench_{size}",
+        dimension=dimension,
+        index_type=index_type,
+        encoding=encoding,
+        retry_delay=retry_delay,
+    )
+    start = time.perf_counter()
+    await provider.ensure_index()
+    load_time = time.perf_counter() - start
+
+    latencies = []
+
+    async def worker(count):
+        for _ in range(count):
+            begin = time.perf_counter()
+            tip = await provider.get_unique_tip()
+            if tip is None:
+                raise click.ClickException("No unique tip was accepted within the generation attempts; lower --duplicate-rate.")
+            await bot.deliver_tip(-1000 - len(latencies) % 100, tip)
+            latencies.append(time.perf_counter() - begin)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(tips // concurrency + (i < tips % concurrency)) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    # Fold the vector log into the (memory-mapped) file and check it reads back whole.
+    expected = provider.faiss_index.ntotal
+    provider._save_faiss_index()
+    reloaded = read_index_mapped(index_path).ntotal
+    if len(provider.vector_log) or reloaded != expected:
+        raise click.ClickException(
+            f"Saving the {size:,} vector {index_type} index failed: {reloaded} of {expected} vectors "
+            f"in the file, {len(provider.vector_log)} still in the log."
+        )
+
+    queries = rng.standard_normal((searches, dimension), dtype="float32")
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    search_times = []
+    for query in queries:
+        begin = time.perf_counter()
+        provider.is_tip_similar(query, provider.similarity_threshold)
+        search_times.append(time.perf_counter() - begin)
+
+    p50, p99 = percentiles(latencies)
+    s50, s99 = percentiles(search_times)
+    memory = rss_mb()
+    provider.unload()
+    return {
+        "size": size,
+        "build_s": build_time,
+        "load_s": load_time,
+        "tips_per_s": len(latencies) / elapsed,
+        "p50_ms": p50,
+        "p99_ms": p99,
+        "search_p50_ms": s50,
+        "search_p99_ms": s99,
+        "rss_mb": memory,
+        "attempts_per_tip": provider.attempt_stats["attempts"] / max(1, provider.attempt_stats["accepted"]),
+    }
+
+
+def micro_benchmarks(iterations):
+    """Per-call cost of the formatter and of a single database write."""
+    import db
+    from services.markdown import escape_markdown
+
+    tip = FakeServices(dimension=8).new_tip()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        escape_markdown(tip)
+    escape_us = (time.perf_counter() - start) / iterations * 1e6
+
+    writes = max(1, iterations // 20)
+    start = time.perf_counter()
+    for i in range(writes):
+        db.create_tip(None, "bench_writes", tip)
+    write_ms = (time.perf_counter() - start) / writes * 1000
+    return escape_us, write_ms
+
+
+@click.command()
+@click.option("--sizes", default="1000,10000,100000,1000000", help="Comma-separated index sizes")
+@click.option("--tips", default=200, help="Tips generated and sent per size")
+@click.option("--concurrency", default=1, help="Tips generated concurrently")
+@click.option("--searches", default=1000, help="Duplicate-check searches timed per size")
+@click.option("--dimension", default=1536, help="Embedding dimension")
+@click.option("--index-type", default="flat", help="Index type (flat, hnsw or ivf)")
+@click.option("--encoding", default="float32", help="Vector encoding (float32, fp16, sq8, pq or pca)")
+@click.option("--latency", default=0.0, help="Seconds added to every fake API request")
+@click.option("--duplicate-rate", default=0.2, help="Share of generated tips that repeat an earlier topic")
+@click.option("--retry-delay", default=1.0, help="Seconds the provider waits after a rejected candidate")
+def main(sizes, tips, concurrency, searches, dimension, index_type, encoding, latency, duplicate_rate, retry_delay):
+    logging.disable(logging.WARNING)
+    services = FakeServices(dimension=dimension, latency=latency, duplicate_rate=duplicate_rate).start()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.update({
+            "TIPS_DATABASE_URL": "sqlite:///" + os.path.join(workdir, "bench.db"),
+            "OPENAI_BASE_URL": f"{services.url}/v1",
+            "OPENAI_API_KEY": "fake",
+            "TELEGRAM_BASE_URL": f"{services.url}/bot",
+            "TELEGRAM_BOT_TOKEN": "1:fake",
+            "TELEGRAM_GLOBAL_RATE": "1000000",
+            "TELEGRAM_CHAT_RATE": "1000000",
+            "TELEGRAM_CHAT_BURST": "1000000",
+        })
+
+        async def run():
+            from services.openai_client import close_client
+            results = []
+            try:
+                for size in (int(size) for size in sizes.split(",")):
+                    results.append(await run_size(size, tips, concurrency, searches, dimension, index_type, encoding, retry_delay, workdir))
+                    click.echo(
+                        "{size:>9,} vectors  build {build_s:6.1f}s  load {load_s:6.2f}s  "
+                        "{tips_per_s:7.1f} tips/s  p50 {p50_ms:7.1f}ms  p99 {p99_ms:7.1f}ms  "
+                        "search p50 {search_p50_ms:7.2f}ms  p99 {search_p99_ms:7.2f}ms  "
+                        "rss {rss_mb:7.0f}MB  {attempts_per_tip:.2f} attempts/tip".format(**results[-1])
+                    )
+            finally:
+                await close_client()
+            return results
+
+        click.echo(f"Fake services at {services.url} ({dimension}d, {index_type}/{encoding}, latency {latency}s)")
+        asyncio.run(run())
+        escape_us, write_ms = micro_benchmarks(20_000)
+        click.echo(f"escape_markdown {escape_us:.1f}us per tip, create_tip {write_ms:.2f}ms per row")
+        click.echo(f"Fake API calls: {services.stats}")
+    services.stop()
+
+
+if __name__ == "__main__":
+    main()
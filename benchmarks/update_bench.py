@@ -0,0 +1,133 @@
+"""
+Measure how quickly the bot answers bursts of commands, by polling or by webhook.
+
+Starts `python bot.py` against the fake Telegram server in fake_services.py and
+sends bursts of owner /id commands, each from its own chat. Reports updates/sec and
+the p50/p99 time from an update being offered to the bot until its reply arrives.
+In webhook mode the updates are posted to the bot's own server with the secret token,
+and a request with a wrong token is checked to be rejected.
+
+    python benchmarks/update_bench.py --mode webhook --updates 500 --burst 50
+    python benchmarks/update_bench.py --mode polling --updates 500 --burst 50
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeServices, post_update  # noqa: E402
+
+OWNER_ID = 4242
+SECRET = "bench-secret"
+
+
+def free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_reply(services, chat_id, timeout):
+    deadline = time.monotonic() + timeout
+    while chat_id not in services.sent_at:
+        if time.monotonic() > deadline:
+            raise click.ClickException(f"No reply to chat {chat_id} within {timeout}s, see the bot log.")
+        time.sleep(0.005)
+    return services.sent_at[chat_id]
+
+
+@click.command()
+@click.option("--mode", type=click.Choice(["webhook", "polling"]), default="webhook")
+@click.option("--updates", default=500, help="Commands sent in total")
+@click.option("--burst", default=50, help="Commands sent at once")
+@click.option("--latency", default=0.0, help="Seconds added to every fake Bot API request")
+def main(mode, updates, burst, latency):
+    services = FakeServices(dimension=8, latency=latency).start()
+    webhook_port = free_port()
+    webhook_url = f"http://127.0.0.1:{webhook_port}/webhook/1"
+
+    def offer(update):
+        if mode == "webhook":
+            return post_update(webhook_url, update, SECRET)
+        services.push_update(update)
+        return 200
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(
+            os.environ,
+            TIPS_DATABASE_URL="sqlite:///" + os.path.join(workdir, "bench.db"),
+            LOG_FILE=os.path.join(workdir, "bot.log"),
+            OPENAI_API_KEY="fake",
+            OPENAI_BASE_URL=f"{services.url}/v1",
+            TELEGRAM_BASE_URL=f"{services.url}/bot",
+            TELEGRAM_BOT_TOKEN="1:fake",
+            OWNER_ID=str(OWNER_ID),
+            TELEGRAM_GLOBAL_RATE="1000000",
+            TELEGRAM_CHAT_RATE="1000000",
+            TELEGRAM_CHAT_BURST="1000000",
+        )
+        if mode == "webhook":
+            env.update(
+                TELEGRAM_WEBHOOK_URL=f"http://127.0.0.1:{webhook_port}",
+                TELEGRAM_WEBHOOK_PORT=str(webhook_port),
+                TELEGRAM_WEBHOOK_SECRET=SECRET,
+            )
+        else:
+            env.pop("TELEGRAM_WEBHOOK_URL", None)
+        process = subprocess.Popen([sys.executable, os.path.join(ROOT, "bot.py")], cwd=ROOT, env=env)
+        try:
+            # The first reply shows the bot is up; in webhook mode retry until its server listens.
+            warmup = services.make_update("/id", -1, OWNER_ID)
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    offer(warmup)
+                    break
+                except OSError:
+                    if time.monotonic() > deadline or process.poll() is not None:
+                        raise click.ClickException("The bot did not start, see its log.")
+                    time.sleep(0.1)
+            wait_for_reply(services, -1, 30)
+
+            if mode == "webhook":
+                status = post_update(webhook_url, services.make_update("/id", -2, OWNER_ID), "wrong")
+                click.echo(f"Update with a wrong secret token: HTTP {status}")
+
+            latencies = []
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=burst) as pool:
+                for first in range(0, updates, burst):
+                    chats = range(first + 1, min(first + burst, updates) + 1)
+                    offered = {}
+
+                    def send(chat_id):
+                        offered[chat_id] = time.perf_counter()
+                        offer(services.make_update("/id", chat_id, OWNER_ID))
+
+                    list(pool.map(send, chats))
+                    for chat_id in chats:
+                        latencies.append(wait_for_reply(services, chat_id, 30) - offered[chat_id])
+            elapsed = time.perf_counter() - start
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    services.stop()
+    click.echo(
+        f"{mode}: {updates / elapsed:.1f} updates/s, "
+        f"p50 {np.percentile(latencies, 50) * 1000:.1f}ms, p99 {np.percentile(latencies, 99) * 1000:.1f}ms "
+        f"(bursts of {burst}, {latency}s API latency)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,21 @@
+import asyncio
 import logging
 import os
+import secrets
+import sys
+import time
 from datetime import datetime, time as dt_time
+from functools import partial
 
-import openai
 from dotenv import load_dotenv
-from telegram import Bot, Update
+
+# Before the services imports below, whose settings are read at import time.
+load_dotenv()
+
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
     Application,
+    CallbackQueryHandler,
     CommandHandler,
     ContextTypes,
     CallbackContext,
@@ -14,191 +23,329 @@ from telegram.ext import (
     filters,
 )
 from telegram.constants import ParseMode
+from telegram.error import BadRequest
+from telegram.request import HTTPXRequest
 
-from services.python_tips import PythonTips
-from services.js_tips import JsTips
-from services.trader_tips import TraderTips
-from services.blockchain_tips import BlockchainTips
+from services.logs import compact_update, configure_logging, should_log_update
+from services.markdown import MAX_MESSAGE_LENGTH, escape_markdown, is_balanced, split_tip
+from services.metrics import format_stats, span, start_metrics_server
+from services.registry import evict_worker, get_channel, get_channels, get_provider
+from services.scheduler import Scheduler
+from services.sender import SendQueue, SendResult
+from services.tip_buffer import next_tip, refill_worker, requeue_tip
 
-load_dotenv()
-logging.basicConfig(
-    filename="bot.log",
-    filemode="a",
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-)
 logger = logging.getLogger(__name__)
 
 
-# Initialize OpenAI client
-openai.api_key = os.getenv("OPENAI_API_KEY")
+_bot = None
+_sender = None
 
-# Initialize Telegram bot
-bot = Bot(token=os.getenv("TELEGRAM_BOT_TOKEN"))
-python_channel_id = os.getenv("PYTHON_CHANNEL_ID")
-trader_channel_id = os.getenv("TRADER_CHANNEL_ID")
-js_channel_id = os.getenv("JS_CHANNEL_ID")
-blockchain_channel_id = os.getenv("BLOCKCHAIN_CHANNEL_ID")
-owner_id = int(os.getenv("OWNER_ID"))
+# Seconds between edits of a streamed /test message; Telegram allows about one edit per second per chat.
+STREAM_EDIT_INTERVAL = float(os.getenv("TEST_STREAM_EDIT_INTERVAL", "1.0"))
+# Extra rounds through the send queue for the rest of a tip that was posted only in part.
+REMAINDER_RETRIES = int(os.getenv("TELEGRAM_REMAINDER_RETRIES", "2"))
 
 
-async def generate_python_tip():
-    try:
-        return await PythonTips().get_unique_tip()
-    except Exception as e:
-        logger.error(f"Error generating Python tip: {e}")
-        return None
+def get_bot_api_url() -> str:
+    """Return the Bot API base URL; TELEGRAM_BASE_URL points it at another server, e.g. a local fake."""
+    return os.getenv("TELEGRAM_BASE_URL", "https://api.telegram.org/bot")
 
 
-async def generate_trader_tip():
-    try:
-        return await TraderTips().get_unique_tip()
-    except Exception as e:
-        logger.error(f"Error generating trader tip: {e}")
-        return None
+def get_bot() -> Bot:
+    """Return the shared Telegram bot, creating it on first use."""
+    global _bot
+    if _bot is None:
+        # A pool larger than the default single connection lets channels send concurrently.
+        _bot = Bot(
+            token=os.getenv("TELEGRAM_BOT_TOKEN"),
+            base_url=get_bot_api_url(),
+            request=HTTPXRequest(connection_pool_size=8),
+        )
+    return _bot
 
 
-async def generate_js_tip():
-    try:
-        return await JsTips().get_unique_tip()
-    except Exception as e:
-        logger.error(f"Error generating JS/TS tip: {e}")
+def set_bot(bot):
+    """Send through the given Bot-compatible object instead of creating one, e.g. in benchmarks."""
+    global _bot, _sender
+    _bot = bot
+    _sender = None
+
+
+def get_sender() -> SendQueue:
+    """Return the outbound send queue of the running event loop."""
+    global _sender
+    if _sender is None or _sender.loop is not asyncio.get_running_loop():
+        _sender = SendQueue(get_bot())
+    return _sender
+
+
+def get_webhook_config():
+    """
+    Return the run_webhook arguments when TELEGRAM_WEBHOOK_URL is set, or None to poll.
+
+    The local server listens on TELEGRAM_WEBHOOK_LISTEN:TELEGRAM_WEBHOOK_PORT and Telegram posts to
+    TELEGRAM_WEBHOOK_URL/TELEGRAM_WEBHOOK_PATH, the path defaulting to one per bot. Requests without
+    the TELEGRAM_WEBHOOK_SECRET header are rejected; without a configured secret a random one is
+    registered on every start.
+    """
+    public_url = os.getenv("TELEGRAM_WEBHOOK_URL")
+    if not public_url:
         return None
+    bot_id = os.getenv("TELEGRAM_BOT_TOKEN", "").split(":")[0]
+    path = os.getenv("TELEGRAM_WEBHOOK_PATH", f"webhook/{bot_id}").strip("/")
+    return {
+        "listen": os.getenv("TELEGRAM_WEBHOOK_LISTEN", "127.0.0.1"),
+        "port": int(os.getenv("TELEGRAM_WEBHOOK_PORT", "8443")),
+        "url_path": path,
+        "webhook_url": f"{public_url.rstrip('/')}/{path}",
+        "secret_token": os.getenv("TELEGRAM_WEBHOOK_SECRET") or secrets.token_urlsafe(32),
+    }
+
+
+def get_owner_id() -> int:
+    return int(os.getenv("OWNER_ID"))
 
 
-async def generate_blockchain_tip():
+async def generate_tip(tip_type, from_buffer=False):
     try:
-        return await BlockchainTips().get_unique_tip()
+        if from_buffer:
+            return await next_tip(tip_type)
+        return await get_provider(tip_type).get_unique_tip()
     except Exception as e:
-        logger.error(f"Error generating blockchain tip: {e}")
+        logger.error(f"Error generating {tip_type} tip: {e}")
         return None
 
 
-def escape_markdown(text):
-    """Handle Telegram markdown formatting for pre-escaped text."""
-    # First unescape any pre-escaped characters
-    text = text.replace("\\*", "*")
-    text = text.replace("\\`", "`")
-
-    # Now escape special characters for Telegram MarkdownV2
-    special_chars = [
-        "_",
-        "[",
-        "]",
-        "(",
-        ")",
-        "~",
-        ">",
-        "#",
-        "+",
-        "-",
-        "=",
-        "|",
-        "{",
-        "}",
-        ".",
-        "!",
-    ]
-    for char in special_chars:
-        text = text.replace(char, f"\\{char}")
+def format_tip(tip):
+    """Return the text and parse mode to send a tip with, falling back to plain text."""
+    message = escape_markdown(tip)
+    if is_balanced(message):
+        return message, ParseMode.MARKDOWN_V2
+    logger.warning("Formatted tip has unbalanced MarkdownV2 entities. Sending it as plain text.")
+    return tip, None
 
-    return text
 
+def message_parts(tip):
+    """Split a tip into (text, parse_mode, plain_text) parts for the send queue."""
+    return [(*format_tip(part), part) for part in split_tip(tip)]
 
-async def send_python_tip():
-    tip = await generate_python_tip()
-    if tip:
-        try:
-            message = escape_markdown(tip)
-            await bot.send_message(
-                chat_id=python_channel_id,
-                text=message,
-                parse_mode=ParseMode.MARKDOWN_V2,
-            )
-            logger.info("Python tip sent successfully!")
-        except Exception as e:
-            logger.error(f"Error sending Python tip: {e}")
 
+async def deliver_tip(chat_id, tip, retries: int = REMAINDER_RETRIES):
+    """
+    Send a tip through the rate-limited queue, split into several messages if it is too long.
 
-async def send_trader_tip():
-    tip = await generate_trader_tip()
-    if tip:
-        try:
-            message = escape_markdown(tip)
-            await bot.send_message(
-                chat_id=trader_channel_id,
-                text=message,
-                parse_mode=ParseMode.MARKDOWN_V2,
-            )
-            logger.info("Trader tip sent successfully!")
-        except Exception as e:
-            logger.error(f"Error sending trader tip: {e}")
-
+    When sending stops after some parts, the rest is queued again right away, up to
+    retries more times, so a half-posted tip is completed before anything else goes out.
 
-async def send_js_tip():
-    tip = await generate_js_tip()
-    if tip:
-        try:
-            message = escape_markdown(tip)
-            await bot.send_message(
-                chat_id=js_channel_id, text=message, parse_mode=ParseMode.MARKDOWN_V2
-            )
-            logger.info("JS/TS tip sent successfully!")
-        except Exception as e:
-            logger.error(f"Error sending JS/TS tip: {e}")
+    Returns:
+        A SendResult over all parts of the tip, true if every part was delivered
+    """
+    parts = message_parts(tip)
+    sent = await get_sender().send(chat_id, parts)
+    delivered = sent.delivered
+    for _ in range(retries):
+        if sent or not sent.retryable or delivered == 0:
+            break
+        logger.warning(f"Resending the last {len(parts) - delivered}/{len(parts)} parts of a tip to chat {chat_id}.")
+        sent = await get_sender().send(chat_id, parts[delivered:])
+        delivered += sent.delivered
+    return SendResult(delivered, len(parts), sent.retryable)
 
 
-async def send_blockchain_tip():
-    tip = await generate_blockchain_tip()
+async def send_tip(tip_type):
+    """Send the next tip of a channel to its Telegram channel. Returns whether it was sent."""
+    channel = get_channel(tip_type)
+    tip = await generate_tip(channel.name, from_buffer=True)
     if tip:
         try:
-            message = escape_markdown(tip)
-            await bot.send_message(
-                chat_id=blockchain_channel_id,
-                text=message,
-                parse_mode=ParseMode.MARKDOWN_V2,
-            )
-            logger.info("Blockchain tip sent successfully!")
+            with span("send", channel.name):
+                sent = await deliver_tip(channel.channel_id, tip)
+            if sent:
+                logger.info(f"{channel.title} tip sent successfully!")
+                return True
         except Exception as e:
-            logger.error(f"Error sending blockchain tip: {e}")
+            logger.error(f"Error sending {channel.title} tip: {e}")
+            requeue_tip(channel.name, tip)
+            return False
+        if not sent.retryable:
+            logger.error(f"Telegram rejected the {channel.title} tip after {sent.delivered}/{sent.total} parts, dropping the rest.")
+            return False
+        # Generation was already paid for, so the parts not yet posted go out first on the next send.
+        logger.error(f"Error sending {channel.title} tip after {sent.delivered}/{sent.total} parts, keeping the rest at the head of the buffer.")
+        requeue_tip(channel.name, "\n\n".join(split_tip(tip)[sent.delivered:]))
+    return False
 
 
 async def test_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /test command."""
-    if update.effective_user.id != owner_id:
+    if update.effective_user.id != get_owner_id():
         await update.message.reply_text(
             "Sorry, this command is only available to the bot owner."
         )
         return
 
     # Get the type of tip to test from the command arguments
-    tip_type = context.args[0] if context.args else "python"
-
-    if tip_type.lower() == "python":
-        tip = await generate_python_tip()
-    elif tip_type.lower() == "trader":
-        tip = await generate_trader_tip()
-    elif tip_type.lower() == "blockchain":
-        tip = await generate_blockchain_tip()
-    elif tip_type.lower() in ["js", "javascript", "typescript"]:
-        tip = await generate_js_tip()
-    else:
+    tip_type = context.args[0] if context.args else next(iter(get_channels()))
+
+    try:
+        channel = get_channel(tip_type)
+    except ValueError:
         await update.message.reply_text(
-            "Please specify 'python', 'trader', 'blockchain' or 'js' after /test"
+            f"Please specify one of {', '.join(repr(name) for name in get_channels())} after /test"
         )
         return
 
-    if tip:
-        message = escape_markdown(tip)
-        await update.message.reply_text(text=message, parse_mode=ParseMode.MARKDOWN_V2)
-    else:
-        await update.message.reply_text("Sorry, there was an error generating the tip.")
+    await stream_test_tip(update, channel)
+
+
+async def _edit_message(message, text, parse_mode=None, reply_markup=None):
+    """Edit a message, ignoring Telegram's complaint when the text did not change."""
+    try:
+        await message.edit_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
+
+
+def format_verdict(verdict, score, tip_id):
+    """Describe the result of TipsProvider.check_tip in one line."""
+    closest = f", closest stored tip {tip_id} at {score:.3f}" if tip_id is not None else ""
+    if verdict == "stored":
+        return f"Verdict: unique, stored{closest}."
+    if verdict == "not_stored":
+        return f"Verdict: unique{closest}, but storing it failed."
+    if verdict == "duplicate":
+        return f"Verdict: duplicate of tip {tip_id} (similarity {score:.3f}), not stored."
+    if verdict == "repeat":
+        return "Verdict: near-verbatim repeat of a stored tip, not stored."
+    return "Verdict: not checked for duplicates (embedding failed), not stored."
+
+
+async def stream_test_tip(update: Update, channel):
+    """
+    Post a placeholder and fill it in as the tip streams from OpenAI, then append the dedup verdict.
+
+    Edits are plain text and at most one per STREAM_EDIT_INTERVAL; the finished tip is
+    formatted like a channel post, split over more messages if it is too long.
+    """
+    message = await update.message.reply_text(f"Generating a {channel.title} tip...")
+    provider = get_provider(channel.name)
+    text = ""
+    last_edit = time.monotonic()
+    try:
+        async for delta in provider.stream_tip_content():
+            text += delta
+            if time.monotonic() - last_edit >= STREAM_EDIT_INTERVAL and text.strip():
+                last_edit = time.monotonic()
+                await _edit_message(message, text[:MAX_MESSAGE_LENGTH - 2] + " ▌")
+    except Exception as e:
+        logger.error(f"Error streaming {channel.name} tip: {e}")
+        await _edit_message(message, "Sorry, there was an error generating the tip.")
+        return
+
+    tip = text.strip()
+    if not tip:
+        await _edit_message(message, "Sorry, there was an error generating the tip.")
+        return
+    try:
+        verdict = format_verdict(*await provider.check_tip(tip))
+    except Exception as e:
+        logger.error(f"Error checking streamed {channel.name} tip: {e}")
+        await _edit_message(message, "Sorry, there was an error checking the tip for duplicates.")
+        return
+    first, *rest = message_parts(f"{tip}\n\n{verdict}")
+    try:
+        await _edit_message(message, *first[:2])
+    except BadRequest as e:
+        logger.warning(f"Could not format the streamed tip, leaving it as plain text: {e}")
+        await _edit_message(message, f"{tip}\n\n{verdict}"[:MAX_MESSAGE_LENGTH])
+        return
+    if rest:
+        await get_sender().send(update.effective_chat.id, rest)
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle the /stats command: timings of generation, search, saves and sends, optionally for one channel."""
+    if update.effective_user.id != get_owner_id():
+        await update.message.reply_text(
+            "Sorry, this command is only available to the bot owner."
+        )
+        return
+
+    channel_name = None
+    if context.args:
+        try:
+            channel_name = get_channel(context.args[0]).name
+        except ValueError:
+            await update.message.reply_text(
+                f"Please specify one of {', '.join(repr(name) for name in get_channels())} after /stats"
+            )
+            return
+
+    await update.message.reply_text(format_stats(channel_name))
+
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /search [channel] <query>: the stored tips closest in meaning, with buttons to page through them."""
+    if update.effective_user.id != get_owner_id():
+        await update.message.reply_text(
+            "Sorry, this command is only available to the bot owner."
+        )
+        return
+
+    args = list(context.args or [])
+    channel_name = None
+    if len(args) > 1:
+        try:
+            channel_name = get_channel(args[0]).name
+            args = args[1:]
+        except ValueError:
+            pass
+    if not args:
+        await update.message.reply_text("Please add what to look for after /search, e.g. /search python list comprehensions")
+        return
+
+    # Callback data is limited to 64 bytes, so the query stays here and the buttons carry only the page.
+    context.user_data["search"] = (" ".join(args), channel_name)
+    text, markup = await _search_page(context.user_data["search"], 1)
+    await update.message.reply_text(text, reply_markup=markup)
+
+
+async def search_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show another page of the owner's last /search."""
+    query = update.callback_query
+    await query.answer()
+    if update.effective_user.id != get_owner_id() or "search" not in context.user_data:
+        return
+    page = int(query.data.split(":")[1])
+    text, markup = await _search_page(context.user_data["search"], page)
+    await _edit_message(query.message, text, reply_markup=markup)
+
+
+async def _search_page(search, page):
+    """Return the text and navigation buttons of one page of results."""
+    # Imported here so that processes that never search do not load faiss and openai for it.
+    from services.search import format_hits, search_tips
+
+    query, channel_name = search
+    try:
+        hits, has_more = await search_tips(query, channel_name, page)
+    except Exception as e:
+        logger.error(f"Error searching tips for {query!r}: {e}")
+        return "Sorry, there was an error searching the tips.", None
+    buttons = []
+    if page > 1:
+        buttons.append(InlineKeyboardButton("« Previous", callback_data=f"search:{page - 1}"))
+    if has_more:
+        buttons.append(InlineKeyboardButton("Next »", callback_data=f"search:{page + 1}"))
+    text = format_hits(hits, page)[:MAX_MESSAGE_LENGTH]
+    return text, InlineKeyboardMarkup([buttons]) if buttons else None
 
 
 async def id_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /id command to get chat ID."""
     # Check if the user is the owner
-    if update.effective_user.id != owner_id:
+    if update.effective_user.id != get_owner_id():
         await update.message.reply_text(
             "Sorry, this command is only available to the bot owner."
         )
@@ -228,22 +375,93 @@ async def id_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def all_handler(update: Update, context: CallbackContext):
-    logger.info(update.message)
+    """Record a compact summary of incoming updates, as selected by LOG_UPDATES."""
+    chat = update.effective_chat
+    if should_log_update(chat.id if chat else None):
+        logger.info(f"Update {compact_update(update)}")
+
+
+def get_channel_ids():
+    """Return the Telegram channel id of each configured channel, skipping unset ones."""
+    return {name: channel.channel_id for name, channel in get_channels().items() if channel.channel_id}
+
+
+def get_schedules():
+    """Return the cron expressions of each channel that has both a channel id and a schedule."""
+    return {
+        name: channel.schedule
+        for name, channel in get_channels().items()
+        if channel.channel_id and channel.schedule
+    }
+
+
+async def post_init(application: Application):
+    """Start the channel scheduler, the metrics endpoint and the workers that refill tip buffers and unload idle indexes."""
+    scheduler = Scheduler()
+    for tip_type, expressions in get_schedules().items():
+        scheduler.add(tip_type, expressions, partial(send_tip, tip_type))
+    # Plain asyncio tasks: the Application is not running yet, so its create_task would not track them.
+    application.bot_data["background_tasks"] = [
+        asyncio.create_task(scheduler.run()),
+        asyncio.create_task(refill_worker(list(get_channel_ids()))),
+        asyncio.create_task(evict_worker()),
+    ]
+    application.bot_data["metrics_server"] = await start_metrics_server()
+
+
+async def post_shutdown(application: Application):
+    """Stop the background workers and the metrics endpoint, then flush the send queue and close the OpenAI client."""
+    global _sender
+    tasks = application.bot_data.pop("background_tasks", [])
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    metrics_server = application.bot_data.pop("metrics_server", None)
+    if metrics_server is not None:
+        metrics_server.close()
+        await metrics_server.wait_closed()
+
+    if _sender is not None and _sender.loop is asyncio.get_running_loop():
+        await _sender.close()
+    _sender = None
+    if "services.openai_client" in sys.modules:
+        from services.openai_client import close_client
+        await close_client()
+    logger.info("Background workers stopped.")
 
 
 def main():
-    """Set up the application and start polling."""
+    """Set up the application and receive updates by webhook or, by default, by polling."""
+    configure_logging()
+
     # Create the Application
-    application = Application.builder().token(os.getenv("TELEGRAM_BOT_TOKEN")).build()
+    application = (
+        Application.builder()
+        .token(os.getenv("TELEGRAM_BOT_TOKEN"))
+        .base_url(get_bot_api_url())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        # Handlers are independent, so a slow /test does not hold up other updates.
+        .concurrent_updates(int(os.getenv("TELEGRAM_CONCURRENT_UPDATES", "8")))
+        .build()
+    )
 
     # Add command handlers
     application.add_handler(CommandHandler("test", test_command))
     application.add_handler(CommandHandler("id", id_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("search", search_command))
+    application.add_handler(CallbackQueryHandler(search_page_callback, pattern=r"^search:\d+$"))
     application.add_handler(MessageHandler(filters.ALL, all_handler))
 
-    # Start the bot with polling
-    logger.info("Bot started! Waiting for scheduled tasks...")
-    application.run_polling()
+    webhook = get_webhook_config()
+    if webhook:
+        logger.info(f"Bot started! Receiving updates at {webhook['webhook_url']}...")
+        application.run_webhook(**webhook)
+    else:
+        logger.info("Bot started! Waiting for scheduled tasks...")
+        application.run_polling()
 
 
 if __name__ == "__main__":
@@ -1,55 +1,295 @@
 import click
 import logging
 import asyncio
-
-import bot
+import sys
+import time
 
 logger = logging.getLogger(__name__)
 
-@click.group()
+# Heavy modules (bot, telegram, openai, faiss) are imported inside the commands
+# so that `cli.py --help` and buffered sends start quickly.
+
+class ChannelGroup(click.Group):
+    """A command group that also accepts any configured channel name as a command."""
+
+    def list_commands(self, ctx):
+        from services.registry import get_channels
+        return super().list_commands(ctx) + list(get_channels())
+
+    def get_command(self, ctx, name):
+        command = super().get_command(ctx, name)
+        if command is not None:
+            return command
+        from services.registry import get_channels
+        if name in get_channels():
+            return channel_command(name)
+        return None
+
+@click.group(cls=ChannelGroup)
 def cli():
-    pass
+    from services.logs import configure_logging
+    configure_logging()
+
+async def close_clients():
+    """Close the OpenAI client if this process used it."""
+    if "services.openai_client" in sys.modules:
+        from services.openai_client import close_client
+        await close_client()
+
+def channel_command(name):
+    """Build the command that sends one tip to a channel."""
+
+    @click.command(name=name, help=f"Send one tip to the {name} channel.")
+    def send():
+        import bot
+
+        async def run():
+            try:
+                return await bot.send_tip(name)
+            finally:
+                await close_clients()
+
+        try:
+            click.echo(f"Starting to send {name} tip...")
+            if asyncio.run(run()):
+                click.echo(f"{name.capitalize()} tip sent successfully")
+            else:
+                click.echo(f"{name.capitalize()} tip was not sent, see bot.log")
+        except Exception as e:
+            click.echo(f"Error sending {name} tip: {e}")
+
+    return send
+
+@click.command(name="all")
+@click.option("--channels", default=None, help="Comma-separated channels to send to, e.g. python,js (default: all)")
+def all_channels(channels):
+    """Generate and send tips to several channels concurrently in one process."""
+    import bot
+
+    configured = bot.get_channels()
+    selected, unknown = [], []
+    for name in (name.strip() for name in channels.split(",")) if channels else configured:
+        try:
+            channel_name = bot.get_channel(name).name
+        except ValueError:
+            unknown.append(name)
+            continue
+        if channel_name not in selected:
+            selected.append(channel_name)
+    if unknown:
+        click.echo(f"Unknown channels: {', '.join(unknown)}. Expected some of: {', '.join(configured)}")
+        return
+
+    async def send(tip_type):
+        start = time.perf_counter()
+        try:
+            sent = await bot.send_tip(tip_type)
+            error = None if sent else "tip was not sent, see bot.log"
+        except Exception as e:
+            sent, error = False, str(e)
+        return tip_type, sent, time.perf_counter() - start, error
+
+    async def run():
+        try:
+            return await asyncio.gather(*(send(tip_type) for tip_type in selected))
+        finally:
+            await close_clients()
+
+    click.echo(f"Starting to send tips to: {', '.join(selected)}...")
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    for tip_type, sent, elapsed, error in results:
+        status = "sent" if sent else f"failed ({error})"
+        click.echo(f"{tip_type:<12} {status:<40} {elapsed:6.2f}s")
+    click.echo(f"Sent {sum(1 for result in results if result[1])}/{len(results)} tips in {time.perf_counter() - start:.2f}s")
 
 @click.command()
-def python():
+@click.argument("tip_types", nargs=-1)
+@click.option("--depth", default=None, type=int, help="Number of tips to keep queued per channel")
+def refill(tip_types, depth):
+    """Top up the pre-generated tip buffers (all channels by default)."""
+    from services.registry import get_channel, get_channels
+    from services.tip_buffer import BUFFER_DEPTH, refill as refill_buffer
+
+    async def run():
+        try:
+            for tip_type in tip_types or get_channels():
+                # Buffers are keyed by channel name, so resolve aliases first.
+                tip_type = get_channel(tip_type).name
+                added = await refill_buffer(tip_type, depth or BUFFER_DEPTH)
+                click.echo(f"{tip_type}: added {added} tips")
+        finally:
+            await close_clients()
+
     try:
-        click.echo("Starting to send Python tip...")
-        asyncio.run(bot.send_python_tip())
-        click.echo("Python tip sent successfully")
+        asyncio.run(run())
     except Exception as e:
-        click.echo(f"Error sending Python tip: {e}")
+        click.echo(f"Error refilling tip buffers: {e}")
+
+@click.command(name="rebuild-index")
+@click.argument("tip_types", nargs=-1)
+@click.option("--batch-size", default=1000, help="Tips read from the database per batch")
+def rebuild_index(tip_types, batch_size):
+    """Re-create channel FAISS indexes from the tips table (all channels by default)."""
+    from services.registry import get_channels, get_provider
+
+    async def run():
+        try:
+            for tip_type in tip_types or get_channels():
+                indexed, reembedded = await get_provider(tip_type).rebuild_index(batch_size)
+                click.echo(f"{tip_type}: indexed {indexed} tips ({reembedded} re-embedded)")
+        finally:
+            await close_clients()
 
-@click.command()
-def js():
     try:
-        click.echo("Starting to send JS tip...")
-        asyncio.run(bot.send_js_tip())
-        click.echo("JS tip sent successfully")
+        asyncio.run(run())
     except Exception as e:
-        click.echo(f"Error sending JS tip: {e}")
+        click.echo(f"Error rebuilding index: {e}")
+
+@click.command(name="compare-index")
+@click.argument("tip_type")
+@click.option("--index-type", default="hnsw", help="Approximate index type to evaluate (hnsw or ivf)")
+@click.option("--queries", default=500, help="Number of near-duplicate queries to run")
+@click.option("--noise", default=0.02, help="Gaussian noise added to stored vectors to build queries")
+@click.option("--threshold", default=0.95, help="Similarity threshold of the duplicate check")
+def compare_index(tip_type, index_type, queries, noise, threshold):
+    """Compare an approximate index against exact search on a channel's stored tips."""
+    import faiss
+    import numpy as np
+    from services.index_factory import compare_with_exact, extract_vectors
+    from services.registry import get_provider
+
+    provider = get_provider(tip_type)
+    asyncio.run(provider.ensure_index())
+    vectors = extract_vectors(provider.faiss_index)
+    if len(vectors) == 0:
+        click.echo(f"No stored vectors for {tip_type}")
+        return
+
+    rng = np.random.default_rng(0)
+    sample = vectors[rng.integers(0, len(vectors), size=queries)]
+    query_vectors = (sample + rng.normal(0, noise, size=sample.shape)).astype("float32")
+    faiss.normalize_L2(query_vectors)
+
+    report = compare_with_exact(vectors, index_type, query_vectors, threshold)
+    for key, value in report.items():
+        click.echo(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
 
 @click.command()
-def trader():
+@click.argument("tip_types", nargs=-1)
+@click.option("--batch-size", default=1000, help="Tips read from the database per batch")
+def reencode(tip_types, batch_size):
+    """Re-encode channel indexes in their configured encoding from the stored float32 embeddings."""
+    import os
+    from services.index_factory import index_encoding
+    from services.registry import get_channels, get_provider
+
+    async def run():
+        try:
+            for tip_type in tip_types or get_channels():
+                provider = get_provider(tip_type)
+                before = os.path.getsize(provider.index_path) if os.path.exists(provider.index_path) else 0
+                indexed, _ = await provider.rebuild_index(batch_size)
+                after = os.path.getsize(provider.index_path)
+                click.echo(
+                    f"{tip_type}: {indexed} vectors as {index_encoding(provider.faiss_index)}, "
+                    f"{before / 1e6:.1f} MB -> {after / 1e6:.1f} MB"
+                )
+        finally:
+            await close_clients()
+
     try:
-        click.echo("Starting to send trader tip...")
-        asyncio.run(bot.send_trader_tip())
-        click.echo("Trader tip sent successfully")
+        asyncio.run(run())
     except Exception as e:
-        click.echo(f"Error sending trader tip: {e}")
+        click.echo(f"Error re-encoding index: {e}")
+
+@click.command(name="compare-encoding")
+@click.argument("tip_type")
+@click.option("--encoding", default="fp16", help="Encoding to evaluate (fp16, sq8, pq or pca)")
+@click.option("--index-type", default="flat", help="Index type both indexes are built with")
+@click.option("--queries", default=500, help="Number of near-duplicate queries to run")
+@click.option("--noise", default=0.02, help="Gaussian noise added to stored vectors to build queries")
+@click.option("--threshold", default=0.95, help="Similarity threshold of the duplicate check")
+def compare_encoding(tip_type, encoding, index_type, queries, noise, threshold):
+    """Report memory saved by an encoding versus the change in similarity scores on a channel's tips."""
+    import faiss
+    import numpy as np
+    from db import iter_tip_batches
+    from services.index_factory import compare_encodings
+    from services.registry import get_channel
+
+    vectors = [
+        np.frombuffer(embedding, dtype="float32")
+        for batch in iter_tip_batches(get_channel(tip_type).name)
+        for _, _, embedding in batch
+        if embedding is not None
+    ]
+    if not vectors:
+        click.echo(f"No stored embeddings for {tip_type}")
+        return
+    vectors = np.stack(vectors)
+
+    rng = np.random.default_rng(0)
+    sample = vectors[rng.integers(0, len(vectors), size=queries)]
+    query_vectors = (sample + rng.normal(0, noise, size=sample.shape)).astype("float32")
+    faiss.normalize_L2(query_vectors)
+
+    report = compare_encodings(vectors, encoding, query_vectors, threshold, index_type)
+    if report["encoding"] != encoding:
+        click.echo(f"Not enough stored vectors to train {encoding}; showing {report['encoding']} instead.")
+    for key, value in report.items():
+        click.echo(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
 
 @click.command()
-def blockchain():
+@click.option("--days", default=None, type=int, help="Only count tips from the last N days")
+def attempts(days):
+    """Show how many generations each accepted tip needed, per channel."""
+    from datetime import datetime, timedelta
+    from db import get_attempt_stats
+
+    since = datetime.now() - timedelta(days=days) if days else None
+    stats = get_attempt_stats(since)
+    if not stats:
+        click.echo("No tips with recorded attempts yet")
+        return
+    click.echo(f"{'channel':<12} {'tips':>6} {'attempts/tip':>13} {'first try':>10}")
+    for tip_type, (tips, total, first) in sorted(stats.items()):
+        click.echo(f"{tip_type:<12} {tips:>6} {total / tips:>13.2f} {first / tips:>10.0%}")
+
+@click.command()
+@click.argument("query", nargs=-1, required=True)
+@click.option("--channel", default=None, help="Channel to search (default: all)")
+@click.option("--page", default=1, help="Page of results to show")
+@click.option("--page-size", default=None, type=int, help="Results per page")
+def search(query, channel, page, page_size):
+    """Find stored tips by meaning, e.g. `cli.py search list comprehensions --channel python`."""
+    from services.search import PAGE_SIZE, format_hits, search_tips
+
+    page_size = page_size or PAGE_SIZE
+
+    async def run():
+        try:
+            return await search_tips(" ".join(query), channel, page, page_size)
+        finally:
+            await close_clients()
+
     try:
-        click.echo("Starting to send blockchain tip...")
-        asyncio.run(bot.send_blockchain_tip())
-        click.echo("Blockchain tip sent successfully")
+        hits, has_more = asyncio.run(run())
     except Exception as e:
-        click.echo(f"Error sending blockchain tip: {e}")
+        click.echo(f"Error searching tips: {e}")
+        return
+    click.echo(format_hits(hits, page, page_size))
+    if has_more:
+        click.echo(f"\nMore results: --page {page + 1}")
 
-cli.add_command(python)
-cli.add_command(js)
-cli.add_command(trader)
-cli.add_command(blockchain)
+cli.add_command(compare_index)
+cli.add_command(search)
+cli.add_command(attempts)
+cli.add_command(reencode)
+cli.add_command(compare_encoding)
+cli.add_command(refill)
+cli.add_command(all_channels)
+cli.add_command(rebuild_index)
 
 if __name__ == '__main__':
     cli()
\ No newline at end of file
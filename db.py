@@ -1,57 +1,140 @@
+from contextlib import contextmanager
 from datetime import datetime
 import os
 
-from sqlalchemy import create_engine
+from dotenv import load_dotenv
+from sqlalchemy import case, create_engine, event, func, inspect, insert, text as sql_text, update
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, SmallInteger
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, SmallInteger, LargeBinary, Index
 
+load_dotenv()
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///" + os.path.join(os.path.dirname(__file__), "tips.db")
-
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "TIPS_DATABASE_URL",
+    "sqlite:///" + os.path.join(os.path.dirname(__file__), "tips.db"),
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# The engine is created and the schema checked on first use, not at import time.
+engine = None
+# Objects stay usable after commit, so writes don't need a refresh round trip.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
 class Tip(Base):
     __tablename__ = "tips"
+    __table_args__ = (Index("ix_tips_type_created_at", "type", "created_at"),)
     id = Column(Integer, primary_key=True, autoincrement=True)
-    faiss_index = Column(Integer)
+    faiss_index = Column(Integer, index=True)
     type = Column(String)
     text = Column(Text)
-    created_at = Column(DateTime, default=datetime.now)
+    created_at = Column(DateTime, default=datetime.now, index=True)
+    # float32 embedding bytes; the FAISS index can be rebuilt from these.
+    embedding = Column(LargeBinary, nullable=True)
+    # Number of generations it took to get this tip past the duplicate check.
+    attempts = Column(SmallInteger, nullable=True)
 
 class SimilarTip(Base):
     __tablename__ = "similar_tips"
+    __table_args__ = (Index("ix_similar_tips_type_created_at", "type", "created_at"),)
     id = Column(Integer, primary_key=True, autoincrement=True)
-    faiss_index = Column(Integer)
+    faiss_index = Column(Integer, index=True)
     type = Column(String)
     text = Column(Text)
+    created_at = Column(DateTime, default=datetime.now, index=True)
+
+class QueuedTip(Base):
+    __tablename__ = "queued_tips"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    type = Column(String, index=True)
+    text = Column(Text)
+    created_at = Column(DateTime, default=datetime.now)
+
+class CachedEmbedding(Base):
+    __tablename__ = "embedding_cache"
+    key = Column(String, primary_key=True)
+    vector = Column(LargeBinary)
     created_at = Column(DateTime, default=datetime.now)
 
-Base.metadata.create_all(engine)
+class ScheduledRun(Base):
+    __tablename__ = "scheduled_runs"
+    name = Column(String, primary_key=True)
+    last_run = Column(DateTime)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers proceed during writes; NORMAL sync is durable across app crashes in WAL mode.
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+def _add_missing_columns(engine):
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(sql_text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+def get_engine():
+    """Create the engine and any missing tables and indexes on first call."""
+    global engine
+    if engine is None:
+        engine = create_engine(
+            SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+        )
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", _set_sqlite_pragmas)
+        SessionLocal.configure(bind=engine)
+        Base.metadata.create_all(engine)
+        # create_all skips existing tables, so add columns and indexes introduced after a table was created.
+        _add_missing_columns(engine)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+    return engine
 
-def create_tip(faiss_index: int, tip_type: str, text: str) -> Tip:
+def get_session() -> Session:
+    """Return a new session bound to the lazily created engine."""
+    get_engine()
+    return SessionLocal()
+
+@contextmanager
+def session_scope():
+    """Provide a session that commits on success and rolls back on error."""
+    db = get_session()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def create_tip(faiss_index: int, tip_type: str, text: str, embedding: bytes = None, attempts: int = None) -> Tip:
     """
     Create and store a new Tip in the database.
     
     Args:
-        faiss_index: The FAISS index for the tip
+        faiss_index: The FAISS index for the tip, or None to use the Tip's own ID
         tip_type: The type of the tip
         text: The content of the tip
+        embedding: The float32 embedding bytes of the tip
+        attempts: The number of generations it took to get a unique tip
     
     Returns:
         The created Tip object
     """
-    db = SessionLocal()
-    tip = Tip(faiss_index=faiss_index, type=tip_type, text=text)
-    db.add(tip)
-    db.commit()
-    db.refresh(tip)
-    db.close()
+    tip = Tip(faiss_index=faiss_index, type=tip_type, text=text, embedding=embedding, attempts=attempts)
+    with session_scope() as db:
+        db.add(tip)
+        if faiss_index is None:
+            db.flush()
+            tip.faiss_index = tip.id
     return tip
 
 def create_similar_tip(faiss_index: int, tip_type: str, text: str) -> SimilarTip:
@@ -66,10 +149,297 @@ def create_similar_tip(faiss_index: int, tip_type: str, text: str) -> SimilarTip
     Returns:
         The created SimilarTip object
     """
-    db = SessionLocal()
     similar_tip = SimilarTip(faiss_index=faiss_index, type=tip_type, text=text)
-    db.add(similar_tip)
-    db.commit()
-    db.refresh(similar_tip)
-    db.close()
-    return similar_tip
\ No newline at end of file
+    with session_scope() as db:
+        db.add(similar_tip)
+    return similar_tip
+
+def create_tips(rows: list) -> int:
+    """
+    Store several Tips in a single transaction.
+    
+    Args:
+        rows: A list of (faiss_index, tip_type, text) tuples
+    
+    Returns:
+        The number of stored rows
+    """
+    if not rows:
+        return 0
+    with session_scope() as db:
+        db.execute(
+            insert(Tip),
+            [
+                {"faiss_index": faiss_index, "type": tip_type, "text": text, "created_at": datetime.now()}
+                for faiss_index, tip_type, text in rows
+            ],
+        )
+    return len(rows)
+
+def create_similar_tips(rows: list) -> int:
+    """
+    Store several SimilarTips in a single transaction.
+    
+    Args:
+        rows: A list of (faiss_index, tip_type, text) tuples
+    
+    Returns:
+        The number of stored rows
+    """
+    if not rows:
+        return 0
+    with session_scope() as db:
+        db.execute(
+            insert(SimilarTip),
+            [
+                {"faiss_index": faiss_index, "type": tip_type, "text": text, "created_at": datetime.now()}
+                for faiss_index, tip_type, text in rows
+            ],
+        )
+    return len(rows)
+
+def enqueue_tip(tip_type: str, text: str, front: bool = False) -> QueuedTip:
+    """
+    Add an already deduplicated tip to the send queue of its channel.
+    
+    Args:
+        tip_type: The type of the tip
+        text: The content of the tip
+        front: Put the tip ahead of every queued tip instead of behind them
+    
+    Returns:
+        The created QueuedTip object
+    """
+    queued_tip = QueuedTip(type=tip_type, text=text)
+    with session_scope() as db:
+        if front:
+            # The queue is drained in ID order, so an ID below the smallest one goes out first.
+            first_id = db.query(func.min(QueuedTip.id)).scalar()
+            queued_tip.id = min(first_id or 0, 1) - 1
+        db.add(queued_tip)
+    return queued_tip
+
+def dequeue_tip(tip_type: str):
+    """
+    Remove and return the oldest queued tip of a type.
+    
+    Args:
+        tip_type: The type of the tip
+    
+    Returns:
+        The text of the dequeued tip, or None if the queue is empty
+    """
+    db = get_session()
+    try:
+        queued_tip = (
+            db.query(QueuedTip)
+            .filter(QueuedTip.type == tip_type)
+            .order_by(QueuedTip.id)
+            .first()
+        )
+        if queued_tip is None:
+            return None
+        text = queued_tip.text
+        db.delete(queued_tip)
+        db.commit()
+        return text
+    finally:
+        db.close()
+
+def count_queued_tips(tip_type: str) -> int:
+    """Return the number of queued tips of a type."""
+    db = get_session()
+    try:
+        return db.query(QueuedTip).filter(QueuedTip.type == tip_type).count()
+    finally:
+        db.close()
+
+def get_cached_embeddings(keys: list) -> dict:
+    """
+    Look up cached embeddings.
+    
+    Args:
+        keys: Cache keys to look up
+    
+    Returns:
+        A dict mapping each found key to its raw float32 vector bytes
+    """
+    db = get_session()
+    try:
+        rows = db.query(CachedEmbedding).filter(CachedEmbedding.key.in_(keys)).all()
+        return {row.key: row.vector for row in rows}
+    finally:
+        db.close()
+
+def store_cached_embeddings(vectors: dict):
+    """
+    Store embeddings in the cache, replacing existing entries.
+    
+    Args:
+        vectors: A dict mapping cache keys to raw float32 vector bytes
+    """
+    if not vectors:
+        return
+    with session_scope() as db:
+        db.execute(
+            insert(CachedEmbedding).prefix_with("OR REPLACE"),
+            [
+                {"key": key, "vector": vector, "created_at": datetime.now()}
+                for key, vector in vectors.items()
+            ],
+        )
+
+def get_tip_texts(tip_type: str) -> list:
+    """
+    Return the texts of all stored and rejected tips of a type.
+    
+    Args:
+        tip_type: The type of the tip
+    
+    Returns:
+        A list of tip texts from the tips and similar_tips tables
+    """
+    db = get_session()
+    try:
+        texts = [row.text for row in db.query(Tip.text).filter(Tip.type == tip_type)]
+        texts += [row.text for row in db.query(SimilarTip.text).filter(SimilarTip.type == tip_type)]
+        return [text for text in texts if text]
+    finally:
+        db.close()
+
+def get_tips_by_ids(tip_ids: list) -> dict:
+    """
+    Fetch the texts of several tips in one query.
+    
+    Args:
+        tip_ids: Tip IDs; unknown IDs are skipped
+    
+    Returns:
+        A dict mapping Tip.id to its text
+    """
+    if not tip_ids:
+        return {}
+    db = get_session()
+    try:
+        rows = db.query(Tip.id, Tip.text).filter(Tip.id.in_(list(tip_ids)))
+        return {tip_id: text for tip_id, text in rows}
+    finally:
+        db.close()
+
+def get_tip_details(tip_ids: list) -> dict:
+    """
+    Fetch the type, text and creation time of several tips in one query.
+    
+    Args:
+        tip_ids: Tip IDs; unknown IDs are skipped
+    
+    Returns:
+        A dict mapping Tip.id to a (type, text, created_at) tuple
+    """
+    if not tip_ids:
+        return {}
+    db = get_session()
+    try:
+        rows = db.query(Tip.id, Tip.type, Tip.text, Tip.created_at).filter(Tip.id.in_(list(tip_ids)))
+        return {tip_id: (tip_type, text, created_at) for tip_id, tip_type, text, created_at in rows}
+    finally:
+        db.close()
+
+def get_attempt_stats(since: datetime = None) -> dict:
+    """
+    Summarize how many generations accepted tips needed, per type.
+    
+    Args:
+        since: Only count tips created at or after this time
+    
+    Returns:
+        A dict mapping tip type to (tips, total attempts, tips accepted on the first attempt)
+    """
+    db = get_session()
+    try:
+        query = db.query(
+            Tip.type,
+            func.count(Tip.id),
+            func.sum(Tip.attempts),
+            func.sum(case((Tip.attempts == 1, 1), else_=0)),
+        ).filter(Tip.attempts.isnot(None))
+        if since is not None:
+            query = query.filter(Tip.created_at >= since)
+        return {tip_type: (tips, int(attempts), int(first)) for tip_type, tips, attempts, first in query.group_by(Tip.type)}
+    finally:
+        db.close()
+
+def get_tip_positions(tip_type: str) -> dict:
+    """
+    Map the legacy positional FAISS index of each tip of a type to its ID.
+    
+    Args:
+        tip_type: The type of the tip
+    
+    Returns:
+        A dict mapping faiss_index to Tip.id
+    """
+    db = get_session()
+    try:
+        rows = db.query(Tip.faiss_index, Tip.id).filter(Tip.type == tip_type, Tip.faiss_index.isnot(None))
+        return {faiss_index: tip_id for faiss_index, tip_id in rows}
+    finally:
+        db.close()
+
+def set_tip_embeddings(embeddings: dict):
+    """
+    Store embeddings on existing tips.
+    
+    Args:
+        embeddings: A dict mapping Tip.id to float32 embedding bytes
+    """
+    if not embeddings:
+        return
+    with session_scope() as db:
+        db.execute(
+            update(Tip),
+            [{"id": tip_id, "embedding": embedding} for tip_id, embedding in embeddings.items()],
+        )
+
+def iter_tip_batches(tip_type: str, batch_size: int = 1000, after_id: int = 0):
+    """
+    Stream the tips of a type in ID order without loading them all at once.
+    
+    Args:
+        tip_type: The type of the tip
+        batch_size: Number of rows per batch
+        after_id: Only return tips with a greater ID
+    
+    Yields:
+        Lists of (id, text, embedding) tuples
+    """
+    while True:
+        db = get_session()
+        try:
+            batch = (
+                db.query(Tip.id, Tip.text, Tip.embedding)
+                .filter(Tip.type == tip_type, Tip.id > after_id)
+                .order_by(Tip.id)
+                .limit(batch_size)
+                .all()
+            )
+        finally:
+            db.close()
+        if not batch:
+            return
+        yield [tuple(row) for row in batch]
+        after_id = batch[-1][0]
+
+def get_last_run(name: str):
+    """Return when a scheduled job last ran, or None if it never did."""
+    db = get_session()
+    try:
+        run = db.get(ScheduledRun, name)
+        return run.last_run if run else None
+    finally:
+        db.close()
+
+def set_last_run(name: str, last_run: datetime):
+    """Record when a scheduled job ran."""
+    with session_scope() as db:
+        db.merge(ScheduledRun(name=name, last_run=last_run))
@@ -0,0 +1,5 @@
+from dotenv import load_dotenv
+
+# Service modules read their settings into constants at import time, so .env must be
+# loaded before the first of them is imported, whichever entry point gets there first.
+load_dotenv()
@@ -0,0 +1,24 @@
+from services.channels import ChannelConfig
+from services.tips_provider import TipsProvider
+
+
+class ChannelTips(TipsProvider):
+    """A tips provider whose model, prompts and index come from the channels config."""
+
+    def __init__(self, channel: ChannelConfig):
+        super().__init__(
+            index_path=channel.index_path,
+            model=channel.model,
+            tip_type=channel.name,
+            model_messages=[],
+            similarity_threshold=channel.similarity_threshold,
+            index_type=channel.index_type,
+            encoding=channel.encoding,
+            parallel_candidates=channel.parallel_candidates,
+            candidate_selection=channel.candidate_selection,
+            novelty_guidance=channel.novelty_guidance,
+        )
+        self.channel = channel
+
+    def build_messages(self):
+        return self.channel.build_messages()
@@ -0,0 +1,113 @@
+import logging
+import os
+import random
+import re
+
+logger = logging.getLogger(__name__)
+
+
+CONFIG_PATH = os.getenv(
+    "CHANNELS_CONFIG",
+    os.path.join(os.path.dirname(__file__), "..", "channels.yaml"),
+)
+
+# How a round of parallel candidates is narrowed to one: the first novel one or the one farthest from stored tips.
+CANDIDATE_SELECTIONS = ("first", "most_novel")
+
+_ENV_PATTERN = re.compile(r"\$\{(\w+)(?::-([^}]*))?\}")
+
+
+def _expand_env(value):
+    """Replace ${NAME} and ${NAME:-default} in strings, recursing into lists and dicts."""
+    if isinstance(value, str):
+        return _ENV_PATTERN.sub(lambda m: os.getenv(m.group(1)) or (m.group(2) or ""), value)
+    if isinstance(value, list):
+        return [_expand_env(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _expand_env(item) for key, item in value.items()}
+    return value
+
+
+def _as_list(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(";") if part.strip()]
+    return list(value)
+
+
+def _as_bool(value):
+    if value is None or isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes")
+
+
+class ChannelConfig:
+    """Settings of one channel, read from the channels config file."""
+
+    def __init__(self, name: str, settings: dict, base_dir: str):
+        self.name = name
+        self.title = settings.get("title", name.capitalize())
+        self.aliases = [alias.lower() for alias in settings.get("aliases", [])]
+        self.channel_id = settings.get("channel_id") or None
+        self.schedule = _as_list(settings.get("schedule"))
+        self.model = settings["model"]
+        self.levels = settings.get("levels") or ["Basic"]
+        self.variables = settings.get("variables", {})
+        system_prompt = settings["system_prompt"]
+        self.system_prompts = system_prompt if isinstance(system_prompt, list) else [system_prompt]
+        self.user_prompt = settings["user_prompt"]
+        self.index_path = os.path.join(base_dir, settings.get("index_path", f"{name}_tips.faiss.index"))
+        self.similarity_threshold = float(settings.get("similarity_threshold", 0.95))
+        self.index_type = settings.get("index_type")
+        self.encoding = settings.get("encoding")
+        self.parallel_candidates = settings.get("parallel_candidates")
+        self.candidate_selection = settings.get("candidate_selection") or None
+        if self.candidate_selection not in (None, *CANDIDATE_SELECTIONS):
+            raise ValueError(
+                f"Channel {name} has candidate_selection {self.candidate_selection!r}, "
+                f"expected one of {', '.join(CANDIDATE_SELECTIONS)}"
+            )
+        self.novelty_guidance = _as_bool(settings.get("novelty_guidance"))
+
+    def build_messages(self):
+        """Return chat messages for one tip request, with a random level and variables."""
+        values = {name: random.choice(choices) for name, choices in self.variables.items()}
+        values["level"] = random.choice(self.levels)
+        return [
+            {"role": "system", "content": random.choice(self.system_prompts).format(**values)},
+            {"role": "user", "content": self.user_prompt.format(**values)},
+        ]
+
+
+def _read_config(path):
+    if path.endswith(".toml"):
+        import tomllib
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    import yaml
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
+
+
+def load_channels(path: str = None) -> dict:
+    """
+    Read the channels config file.
+
+    Args:
+        path: YAML or TOML file, CHANNELS_CONFIG by default
+
+    Returns:
+        dict: Channel name to ChannelConfig, in file order
+    """
+    path = os.path.abspath(path or CONFIG_PATH)
+    config = _expand_env(_read_config(path))
+    defaults = config.get("defaults", {})
+    channels = {}
+    for name, settings in (config.get("channels") or {}).items():
+        try:
+            channels[name] = ChannelConfig(name, {**defaults, **settings}, os.path.dirname(path))
+        except KeyError as e:
+            raise ValueError(f"Channel {name} in {path} is missing setting {e}") from e
+    logger.info(f"Loaded {len(channels)} channels from {path}")
+    return channels
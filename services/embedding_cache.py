@@ -0,0 +1,95 @@
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from db import get_cached_embeddings, store_cached_embeddings
+from services.metrics import register_counters
+
+logger = logging.getLogger(__name__)
+
+
+MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_ENTRIES", "2048"))
+
+
+class EmbeddingCache:
+    """Two-level embedding cache: an in-memory LRU in front of the embedding_cache table."""
+
+    def __init__(self, max_entries: int = MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(text: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: list, model: str) -> dict:
+        """
+        Look up embeddings for texts.
+
+        Returns:
+            A dict mapping each cached text to its float32 vector
+        """
+        keys = {text: self.make_key(text, model) for text in texts}
+        found = {}
+        missing = []
+        for text, key in keys.items():
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                found[text] = self._memory[key]
+                self.memory_hits += 1
+            else:
+                missing.append(text)
+
+        if missing:
+            try:
+                stored = get_cached_embeddings([keys[text] for text in missing])
+            except Exception as e:
+                logger.error(f"Error reading embedding cache: {e}")
+                stored = {}
+            for text in missing:
+                raw = stored.get(keys[text])
+                if raw is None:
+                    self.misses += 1
+                    continue
+                vector = np.frombuffer(raw, dtype="float32")
+                self._remember(keys[text], vector)
+                found[text] = vector
+                self.disk_hits += 1
+        return found
+
+    def put_many(self, embeddings: dict, model: str):
+        """Store a dict mapping texts to their embeddings."""
+        vectors = {}
+        for text, embedding in embeddings.items():
+            key = self.make_key(text, model)
+            vector = np.asarray(embedding, dtype="float32")
+            self._remember(key, vector)
+            vectors[key] = vector.tobytes()
+        try:
+            store_cached_embeddings(vectors)
+        except Exception as e:
+            logger.error(f"Error writing embedding cache: {e}")
+
+    def counters(self) -> dict:
+        """Lookups since start by where they were answered: memory, the database or not at all."""
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+
+embedding_cache = EmbeddingCache()
+register_counters("embedding_cache", embedding_cache.counters)
@@ -0,0 +1,370 @@
+import logging
+import math
+import os
+import time
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+INDEX_TYPES = ("flat", "hnsw", "ivf")
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 128
+IVF_NPROBE = 16
+# IVF needs enough vectors to train its coarse quantizer; below this a flat index is used.
+IVF_MIN_TRAINING = 1000
+
+# How vectors are stored: full floats, half floats, 8-bit scalars, product quantization
+# codes, or a PCA projection to PCA_DIMENSION components.
+ENCODINGS = ("float32", "fp16", "sq8", "pq", "pca")
+# Encodings learned from the stored vectors; like IVF they need IVF_MIN_TRAINING of them.
+TRAINED_ENCODINGS = ("sq8", "pq", "pca")
+# Lossy encodings whose decoded vectors should not seed another index.
+LOSSY_ENCODINGS = ("sq8", "pq", "pca")
+PQ_DIMS_PER_CODE = 8
+PCA_DIMENSION = int(os.getenv("PCA_DIMENSION", "256"))
+
+# Read flags for memory-mapping an index file. Only flat codes (flat and HNSW storage)
+# are mapped: IO_FLAG_MMAP would open IVF inverted lists as OnDiskInvertedLists, which
+# cannot be serialized to fold in new vectors, so IVF indexes are read into memory.
+MMAP_FLAGS = [
+    getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY,
+]
+
+
+class LayeredIndex:
+    """
+    A read-only, memory-mapped base index plus an in-memory delta holding the
+    vectors added since the base file was written.
+
+    Searches query both layers and merge the results; only the delta grows in
+    memory, and the next save folds it back into the file.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.d = base.d
+        self.delta = with_ids(faiss.IndexFlatIP(base.d))
+
+    @property
+    def ntotal(self):
+        return self.base.ntotal + self.delta.ntotal
+
+    def add_with_ids(self, vectors, ids):
+        self.delta.add_with_ids(vectors, ids)
+
+    def search(self, queries, k):
+        if self.delta.ntotal == 0:
+            return self.base.search(queries, k)
+        if self.base.ntotal == 0:
+            return self.delta.search(queries, k)
+        base_scores, base_ids = self.base.search(queries, k)
+        delta_scores, delta_ids = self.delta.search(queries, k)
+        scores = np.hstack([base_scores, delta_scores])
+        ids = np.hstack([base_ids, delta_ids])
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+def read_index_mapped(path: str):
+    """Open an index file memory-mapped and read-only, falling back to a full read."""
+    for flags in MMAP_FLAGS:
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError as e:
+            logger.debug(f"Could not memory-map {path} with flags {flags}: {e}")
+    logger.info(f"Index {path} cannot be memory-mapped. Reading it into memory.")
+    return faiss.read_index(path)
+
+
+def materialize(index):
+    """Return a writable in-memory copy of a layered index with both layers merged."""
+    if not isinstance(index, LayeredIndex):
+        return index
+    # A clone of a mapped index still views the file; a serialize round trip owns its data.
+    merged = faiss.deserialize_index(faiss.serialize_index(index.base))
+    if index.delta.ntotal:
+        merged.add_with_ids(extract_vectors(index.delta), extract_ids(index.delta))
+    return merged
+
+
+def _ivf_nlist(ntotal: int) -> int:
+    return max(1, min(int(4 * math.sqrt(ntotal)), ntotal // 39))
+
+
+def inner_index(index):
+    """Return the index that stores the vectors, looking through an ID map."""
+    if isinstance(index, LayeredIndex):
+        return inner_index(index.base)
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexPreTransform):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def with_ids(index):
+    """Wrap an index so that vectors are added and found by external IDs (Tip.id)."""
+    return faiss.IndexIDMap2(index)
+
+
+def index_kind(index) -> str:
+    """Return the INDEX_TYPES name describing a FAISS index."""
+    index = inner_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def index_encoding(index) -> str:
+    """Return the ENCODINGS name describing how a FAISS index stores its vectors."""
+    outer = index.base if isinstance(index, LayeredIndex) else index
+    if isinstance(outer, faiss.IndexIDMap):
+        outer = faiss.downcast_index(outer.index)
+    if isinstance(outer, faiss.IndexPreTransform):
+        return "pca"
+    inner = inner_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner = faiss.downcast_index(inner.storage)
+    if isinstance(inner, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "fp16" if inner.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    if isinstance(inner, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    return "float32"
+
+
+def configure_search(index, ef_search: int = HNSW_EF_SEARCH, nprobe: int = IVF_NPROBE):
+    """Apply the search-time recall knobs for approximate indexes."""
+    inner = inner_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = ef_search
+    elif isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = nprobe
+    return index
+
+
+def _storage_spec(encoding: str, dimension: int) -> str:
+    """Return the index_factory storage component for an encoding."""
+    if encoding == "fp16":
+        return "SQfp16"
+    if encoding == "sq8":
+        return "SQ8"
+    if encoding == "pq":
+        codes = max(1, dimension // PQ_DIMS_PER_CODE)
+        while dimension % codes:
+            codes -= 1
+        return f"PQ{codes}"
+    return "Flat"
+
+
+def _create_pca_index(index_type: str, dimension: int, training_vectors: np.ndarray):
+    """Fit a PCA projection with scikit-learn and index the re-normalized projected vectors."""
+    from sklearn.decomposition import PCA
+
+    components = min(PCA_DIMENSION, dimension, len(training_vectors))
+    logger.info(f"Fitting PCA from {dimension} to {components} dimensions on {len(training_vectors)} vectors...")
+    pca = PCA(n_components=components).fit(training_vectors)
+    projection = faiss.LinearTransform(dimension, components, True)
+    faiss.copy_array_to_vector(pca.components_.astype("float32").ravel(), projection.A)
+    faiss.copy_array_to_vector((-pca.components_ @ pca.mean_).astype("float32"), projection.b)
+    projection.is_trained = True
+    projection.set_is_orthonormal()
+
+    projected = projection.apply(np.ascontiguousarray(training_vectors, dtype="float32"))
+    faiss.normalize_L2(projected)
+    index = faiss.IndexPreTransform(create_index(index_type, components, training_vectors=projected))
+    # Applied in order: project, then normalize so inner products stay cosine similarities.
+    index.prepend_transform(faiss.NormalizationTransform(components))
+    index.prepend_transform(projection)
+    return index
+
+
+def create_index(index_type: str, dimension: int, training_vectors: np.ndarray = None, encoding: str = "float32"):
+    """
+    Create an empty inner-product index of the given type.
+
+    Args:
+        index_type: One of INDEX_TYPES
+        dimension: Vector dimension
+        training_vectors: Sample used to train IVF and learned encodings; without enough
+            of them a flat index and float32 storage are used instead
+        encoding: One of ENCODINGS
+
+    Returns:
+        A FAISS index ready for add()
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type}. Expected one of {INDEX_TYPES}.")
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding: {encoding}. Expected one of {ENCODINGS}.")
+    if index_type == "hnsw" and encoding == "pq":
+        raise ValueError("HNSW with PQ storage does not support inner-product search. Use flat or ivf.")
+
+    enough_training = training_vectors is not None and len(training_vectors) >= IVF_MIN_TRAINING
+    if encoding in TRAINED_ENCODINGS and not enough_training:
+        logger.info(f"Not enough vectors to train {encoding} encoding (need {IVF_MIN_TRAINING}). Storing float32 for now.")
+        encoding = "float32"
+    if encoding == "pca":
+        return _create_pca_index(index_type, dimension, training_vectors)
+
+    storage = _storage_spec(encoding, dimension)
+    if index_type == "hnsw":
+        if encoding == "float32":
+            index = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.index_factory(dimension, f"HNSW{HNSW_M}_{storage}", faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif index_type == "ivf" and enough_training:
+        nlist = _ivf_nlist(len(training_vectors))
+        logger.info(f"Training IVF index with {nlist} lists on {len(training_vectors)} vectors...")
+        index = faiss.index_factory(dimension, f"IVF{nlist},{storage}", faiss.METRIC_INNER_PRODUCT)
+    else:
+        if index_type == "ivf":
+            logger.info(f"Not enough vectors to train IVF (need {IVF_MIN_TRAINING}). Using a flat index for now.")
+        if encoding == "float32":
+            return faiss.IndexFlatIP(dimension)
+        index = faiss.index_factory(dimension, storage, faiss.METRIC_INNER_PRODUCT)
+
+    if not index.is_trained:
+        index.train(training_vectors)
+    return configure_search(index)
+
+
+def extract_vectors(index) -> np.ndarray:
+    """Return all stored vectors of an index as a float32 array, in insertion order."""
+    if isinstance(index, LayeredIndex):
+        return np.vstack([extract_vectors(index.base), extract_vectors(index.delta)])
+    # Reconstruct through any PCA transform so vectors come back in the input dimension.
+    outer = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if outer.ntotal == 0:
+        return np.zeros((0, outer.d), dtype="float32")
+    inner = inner_index(index)
+    if isinstance(inner, faiss.IndexIVF):
+        inner.make_direct_map()
+    return outer.reconstruct_n(0, outer.ntotal)
+
+
+def extract_ids(index) -> np.ndarray:
+    """Return the external IDs of an index in insertion order (positions for a plain index)."""
+    if isinstance(index, LayeredIndex):
+        return np.concatenate([extract_ids(index.base), extract_ids(index.delta)])
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.vector_to_array(index.id_map).astype("int64")
+    return np.arange(index.ntotal, dtype="int64")
+
+
+def migrate_index(index, index_type: str, encoding: str = None):
+    """
+    Re-create an ID-mapped index as index_type with the given encoding, keeping its vectors and IDs.
+
+    Returns the original index when it already has the requested type and encoding,
+    or when there are not yet enough vectors to train them.
+    """
+    encoding = encoding or index_encoding(index)
+    if index_kind(index) == index_type and index_encoding(index) == encoding:
+        return configure_search(index)
+    vectors = extract_vectors(index)
+    new_inner = create_index(index_type, index.d, training_vectors=vectors, encoding=encoding)
+    if index_kind(new_inner) == index_kind(index) and index_encoding(new_inner) == index_encoding(index):
+        return index
+    logger.info(
+        f"Migrating index with {index.ntotal} vectors from {index_kind(index)}/{index_encoding(index)} "
+        f"to {index_kind(new_inner)}/{index_encoding(new_inner)}..."
+    )
+    new_index = with_ids(new_inner)
+    if len(vectors):
+        new_index.add_with_ids(vectors, extract_ids(index))
+    return new_index
+
+
+def compare_with_exact(vectors: np.ndarray, index_type: str, queries: np.ndarray, threshold: float) -> dict:
+    """
+    Measure how well an approximate index reproduces exact top-1 search.
+
+    Args:
+        vectors: Stored, L2-normalized vectors
+        index_type: Approximate index type to evaluate
+        queries: L2-normalized query vectors
+        threshold: Similarity threshold used for the duplicate check
+
+    Returns:
+        A dict with recall@1, duplicate verdict agreement and search latencies
+    """
+    dimension = vectors.shape[1]
+    exact = faiss.IndexFlatIP(dimension)
+    exact.add(vectors)
+    approx = create_index(index_type, dimension, training_vectors=vectors)
+    approx.add(vectors)
+
+    start = time.perf_counter()
+    exact_scores, exact_ids = exact.search(queries, 1)
+    exact_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    approx_scores, approx_ids = approx.search(queries, 1)
+    approx_time = time.perf_counter() - start
+
+    exact_dup = exact_scores[:, 0] >= threshold
+    approx_dup = approx_scores[:, 0] >= threshold
+    return {
+        "index_type": index_kind(approx),
+        "vectors": len(vectors),
+        "queries": len(queries),
+        "recall_at_1": float(np.mean(exact_ids[:, 0] == approx_ids[:, 0])),
+        "exact_duplicates": int(exact_dup.sum()),
+        "missed_duplicates": int(np.sum(exact_dup & ~approx_dup)),
+        "verdict_agreement": float(np.mean(exact_dup == approx_dup)),
+        "exact_ms_per_query": 1000 * exact_time / len(queries),
+        "approx_ms_per_query": 1000 * approx_time / len(queries),
+    }
+
+
+def compare_encodings(vectors: np.ndarray, encoding: str, queries: np.ndarray, threshold: float, index_type: str = "flat") -> dict:
+    """
+    Measure the memory saved by an encoding and how much it moves top-1 similarity scores.
+
+    Args:
+        vectors: Stored, L2-normalized float32 vectors
+        encoding: Encoding to evaluate, one of ENCODINGS
+        queries: L2-normalized query vectors
+        threshold: Similarity threshold used for the duplicate check
+        index_type: Index type both indexes are built with
+
+    Returns:
+        A dict with index sizes, score changes and duplicate verdict agreement
+    """
+    dimension = vectors.shape[1]
+    exact = create_index(index_type, dimension, training_vectors=vectors)
+    exact.add(vectors)
+    encoded = create_index(index_type, dimension, training_vectors=vectors, encoding=encoding)
+    encoded.add(vectors)
+
+    exact_scores, exact_ids = exact.search(queries, 1)
+    encoded_scores, encoded_ids = encoded.search(queries, 1)
+    exact_bytes = len(faiss.serialize_index(exact))
+    encoded_bytes = len(faiss.serialize_index(encoded))
+    change = encoded_scores[:, 0] - exact_scores[:, 0]
+
+    exact_dup = exact_scores[:, 0] >= threshold
+    encoded_dup = encoded_scores[:, 0] >= threshold
+    return {
+        "encoding": index_encoding(encoded),
+        "vectors": len(vectors),
+        "queries": len(queries),
+        "float32_bytes": exact_bytes,
+        "encoded_bytes": encoded_bytes,
+        "memory_saved": 1 - encoded_bytes / exact_bytes,
+        "recall_at_1": float(np.mean(exact_ids[:, 0] == encoded_ids[:, 0])),
+        "mean_score_change": float(change.mean()),
+        "max_abs_score_change": float(np.abs(change).max()),
+        "exact_duplicates": int(exact_dup.sum()),
+        "missed_duplicates": int(np.sum(exact_dup & ~encoded_dup)),
+        "false_duplicates": int(np.sum(~exact_dup & encoded_dup)),
+        "verdict_agreement": float(np.mean(exact_dup == encoded_dup)),
+    }
@@ -0,0 +1,83 @@
+import logging
+import re
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240501)
+_A = _rng.integers(1, _PRIME, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, size=NUM_PERM, dtype=np.uint64)
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """Return the hashed word n-grams of a text, ignoring case, punctuation and emojis."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        words = words + [""] * (size - len(words))
+    return {
+        zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) & 0x7FFFFFFF
+        for i in range(len(words) - size + 1)
+    }
+
+
+def minhash(text: str) -> np.ndarray:
+    """Compute the MinHash signature of a text."""
+    hashes = np.fromiter(shingles(text), dtype=np.uint64)
+    permuted = (np.outer(hashes, _A) + _B) % _PRIME
+    return permuted.min(axis=0)
+
+
+class LexicalFilter:
+    """
+    MinHash/LSH index over stored tip texts used to catch near-verbatim repeats
+    before paying for an embedding request.
+    """
+
+    def __init__(self, duplicate_threshold: float = 0.8):
+        self.duplicate_threshold = duplicate_threshold
+        self._signatures = []
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _band_keys(self, signature):
+        return [(band, signature[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+    def add(self, text: str):
+        signature = minhash(text)
+        position = len(self._signatures)
+        self._signatures.append(signature)
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(position)
+
+    def add_many(self, texts):
+        for text in texts:
+            self.add(text)
+
+    def max_similarity(self, text: str) -> float:
+        """Estimate the highest Jaccard similarity between text and any stored text."""
+        signature = minhash(text)
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self._buckets.get(key, ()))
+        if not candidates:
+            return 0.0
+        return max(float(np.mean(self._signatures[i] == signature)) for i in candidates)
+
+    def is_duplicate(self, text: str) -> bool:
+        """Return whether text is a near-verbatim repeat of a stored text."""
+        similarity = self.max_similarity(text)
+        if similarity >= self.duplicate_threshold:
+            logger.info(f"Lexical similarity {similarity:.2f} >= {self.duplicate_threshold}. Tip is a near-verbatim repeat.")
+            return True
+        return False
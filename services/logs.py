@@ -0,0 +1,113 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# What the catch-all handler records about incoming updates: off, sample, chats or all.
+LOG_UPDATES = os.getenv("LOG_UPDATES", "sample").lower()
+# Share of updates recorded in sample mode.
+LOG_UPDATES_SAMPLE_RATE = float(os.getenv("LOG_UPDATES_SAMPLE_RATE", "0.01"))
+# Chat ids recorded in chats mode, separated by ";" or ",".
+LOG_UPDATES_CHATS = {
+    int(chat_id) for chat_id in os.getenv("LOG_UPDATES_CHATS", "").replace(",", ";").split(";") if chat_id.strip()
+}
+
+_listener = None
+_queue_handler = None
+
+
+def configure_logging(filename: str = LOG_FILE, level: str = LOG_LEVEL):
+    """
+    Route all log records through a queue to a rotating file written by a background thread.
+
+    Callers only pay for putting the record on the queue, so the event loop never waits
+    on the disk. Calling it again is a no-op.
+
+    Returns:
+        The running QueueListener
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        filename, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+    )
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    records = queue.SimpleQueue()
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    _queue_handler = logging.handlers.QueueHandler(records)
+    root.addHandler(_queue_handler)
+
+    _listener = logging.handlers.QueueListener(records, file_handler, respect_handler_level=True)
+    _listener.start()
+    # Flush what is still queued when the process exits.
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Write out the queued records and stop the background writer."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = _queue_handler = None
+
+
+def should_log_update(chat_id, mode: str = LOG_UPDATES) -> bool:
+    """Decide whether the catch-all handler records an update from chat_id."""
+    if mode == "all":
+        return True
+    if mode == "sample":
+        return random.random() < LOG_UPDATES_SAMPLE_RATE
+    if mode == "chats":
+        return chat_id in LOG_UPDATES_CHATS
+    return False
+
+
+def compact_update(update) -> str:
+    """
+    Summarize an update as one JSON line, without its text or media.
+
+    Returns:
+        A JSON object with the update, chat, user and message ids, the chat type,
+        the kind of message and the length of its text or caption
+    """
+    message = update.effective_message
+    chat = update.effective_chat
+    user = update.effective_user
+    record = {
+        "update_id": update.update_id,
+        "chat_id": chat.id if chat else None,
+        "chat_type": chat.type if chat else None,
+        "user_id": user.id if user else None,
+    }
+    if message is not None:
+        text = message.text or message.caption or ""
+        record.update({
+            "message_id": message.message_id,
+            "kind": _message_kind(message),
+            "length": len(text),
+        })
+    return json.dumps(record, separators=(",", ":"))
+
+
+def _message_kind(message) -> str:
+    if message.text is not None:
+        return "command" if message.text.startswith("/") else "text"
+    for kind in ("photo", "video", "document", "sticker", "voice", "audio", "animation", "poll", "location"):
+        if getattr(message, kind, None):
+            return kind
+    return "other"
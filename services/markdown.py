@@ -0,0 +1,217 @@
+# Characters that must be escaped outside code entities in Telegram MarkdownV2.
+# "*" and "`" are handled separately because tips use them for bold text and code.
+SPECIAL_CHARS = "_[]()~>#+-=|{}.!"
+
+# Backslash first, so the escapes added for the other characters are not doubled.
+_PLAIN_ESCAPES = [(char, f"\\{char}") for char in "\\" + SPECIAL_CHARS + "`"]
+
+
+def _escape_plain(text: str) -> str:
+    # Pre-escaped \* from the model and markdown-style ** both mean a bold marker.
+    if "\\" in text:
+        text = text.replace("\\*", "*").replace("\\`", "`")
+    if "**" in text:
+        text = text.replace("**", "*")
+    for char, escaped in _PLAIN_ESCAPES:
+        if char in text:
+            text = text.replace(char, escaped)
+    return text
+
+
+def _escape_code(code: str) -> str:
+    """Inside code entities only backslash and backtick need escaping."""
+    if "\\" in code:
+        code = code.replace("\\", "\\\\")
+    if "`" in code:
+        code = code.replace("`", "\\`")
+    return code
+
+
+def _format_fence(body: str) -> str:
+    # The language tag on the opening line is part of the entity, not the code.
+    language, newline, code = body.partition("\n")
+    if not newline:
+        language, code = "", body
+    return f"```{language}{newline}{_escape_code(code)}```"
+
+
+def _split_code(text: str):
+    """
+    Split text into alternating plain and code segments in one left-to-right scan.
+
+    Yields (is_code, segment) where code segments include their delimiters.
+    A ``` fence runs to the next ``` or the end of the text; inline code ends at
+    the next backtick on the same line, otherwise the backtick is plain text.
+    """
+    position = 0
+    search = 0
+    while True:
+        start = text.find("`", search)
+        if start < 0:
+            break
+        if start > 0 and text[start - 1] == "\\":
+            search = start + 1
+            continue
+        if text.startswith("```", start):
+            end = text.find("```", start + 3)
+            end = len(text) if end < 0 else end + 3
+        else:
+            end = text.find("`", start + 1)
+            newline = text.find("\n", start + 1)
+            if end < 0 or (0 <= newline < end):
+                search = start + 1
+                continue
+            end += 1
+        yield False, text[position:start]
+        yield True, text[start:end]
+        position = search = end
+    yield False, text[position:]
+
+
+def escape_markdown(text: str) -> str:
+    """
+    Convert a generated tip to Telegram MarkdownV2.
+
+    Code entities are found in a single scan; bold (*...*, also **...**),
+    inline code and ``` fences are kept as entities and every other special
+    character is escaped. Code content only gets the backslash/backtick
+    escapes MarkdownV2 requires there, so examples are sent verbatim.
+    Unclosed fences are closed and an unmatched bold marker is escaped, so
+    the result always has balanced entities.
+    """
+    parts = []
+    stars = 0
+    for is_code, segment in _split_code(text):
+        if not is_code:
+            segment = _escape_plain(segment)
+            stars += segment.count("*")
+        elif segment.startswith("```"):
+            segment = _format_fence(segment[3:-3] if segment.endswith("```") and len(segment) >= 6 else segment[3:])
+        else:
+            segment = f"`{_escape_code(segment[1:-1])}`"
+        parts.append(segment)
+
+    if stars % 2:
+        # Plain segments sit at even positions; escape the last bold marker.
+        for i in range(len(parts) - 1, -1, -2):
+            head, star, tail = parts[i].rpartition("*")
+            if star:
+                parts[i] = f"{head}\\*{tail}"
+                break
+    return "".join(parts)
+
+
+def is_balanced(message: str) -> bool:
+    """Check that an escaped MarkdownV2 message opens and closes every entity it uses."""
+    bold = False
+    code = None
+    i = 0
+    while i < len(message):
+        char = message[i]
+        if char == "\\":
+            i += 2
+            continue
+        if code is None:
+            if message.startswith("```", i):
+                code = "```"
+                i += 3
+                continue
+            if char == "`":
+                code = "`"
+            elif char == "*":
+                bold = not bold
+            elif char in SPECIAL_CHARS:
+                return False
+        elif message.startswith(code, i):
+            i += len(code)
+            code = None
+            continue
+        i += 1
+    return not bold and code is None
+
+
+MAX_MESSAGE_LENGTH = 4096
+
+
+def _blocks(text: str) -> list:
+    """Split text into paragraphs and whole ``` fences."""
+    blocks, current, in_fence = [], [], False
+    for line in text.split("\n"):
+        if line.lstrip().startswith("```"):
+            if not in_fence and current:
+                blocks.append("\n".join(current))
+                current = []
+            current.append(line)
+            in_fence = not in_fence
+            if not in_fence:
+                blocks.append("\n".join(current))
+                current = []
+        elif not in_fence and not line.strip():
+            if current:
+                blocks.append("\n".join(current))
+                current = []
+        else:
+            current.append(line)
+    if current:
+        blocks.append("\n".join(current))
+    return blocks
+
+
+def _fits(text: str, limit: int) -> bool:
+    return len(escape_markdown(text)) <= limit
+
+
+def _split_block(block: str, limit: int) -> list:
+    """Split one paragraph or fence that is too long into pieces that fit."""
+    if _fits(block, limit):
+        return [block]
+    lines = block.split("\n")
+    opener = ""
+    if lines[0].lstrip().startswith("```"):
+        # Every piece of a split fence gets its own opening and closing line.
+        opener = lines.pop(0)
+        if lines and lines[-1].strip() == "```":
+            lines.pop()
+    wrap = (lambda body: f"{opener}\n{body}\n```") if opener else (lambda body: body)
+
+    pieces, current = [], []
+    for line in lines:
+        candidate = current + [line]
+        if _fits(wrap("\n".join(candidate)), limit):
+            current = candidate
+            continue
+        if current:
+            pieces.append(wrap("\n".join(current)))
+        current = [line]
+        # A single line longer than a message is cut; escaping at most doubles its length.
+        while not _fits(wrap(current[0]), limit):
+            cut = max((limit - len(opener) - 8) // 2, 1)
+            pieces.append(wrap(current[0][:cut]))
+            current = [current[0][cut:]]
+    if current:
+        pieces.append(wrap("\n".join(current)))
+    return pieces
+
+
+def split_tip(text: str, limit: int = MAX_MESSAGE_LENGTH) -> list:
+    """
+    Split a raw tip into parts whose formatted MarkdownV2 fits in one message.
+
+    Parts break at paragraph and fence boundaries; a fence longer than a
+    message is split by lines and each part re-opened with its language tag.
+    """
+    if _fits(text, limit):
+        return [text]
+    parts, current = [], ""
+    for block in _blocks(text):
+        for piece in _split_block(block, limit):
+            candidate = f"{current}\n\n{piece}" if current else piece
+            if _fits(candidate, limit):
+                current = candidate
+            else:
+                if current:
+                    parts.append(current)
+                current = piece
+    if current:
+        parts.append(current)
+    return parts
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+# Upper bounds in seconds, from a fast FAISS search to a slow generation with retries.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60, 120)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+
+class Histogram:
+    """Counts of observed durations per bucket, with their sum, maximum and error count."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float, error: bool = False):
+        index = 0
+        while index < len(BUCKETS) and seconds > BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        if error:
+            self.errors += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside the bucket that contains it."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKETS[index - 1] if index else 0.0
+                upper = BUCKETS[index] if index < len(BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+
+_histograms = {}
+# Readers of counters kept by other services, e.g. the embedding cache, by prefix.
+_counters = {}
+
+
+def observe(name: str, channel: str, seconds: float, error: bool = False):
+    """Record one duration of a span, e.g. observe("search", "python", 0.002)."""
+    key = (name, channel or "")
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = Histogram()
+    histogram.observe(seconds, error)
+
+
+def register_counters(prefix: str, read):
+    """
+    Show counters kept elsewhere in /stats and on the metrics endpoint.
+
+    Args:
+        prefix: Name the counters are grouped under, e.g. "embedding_cache"
+        read: Callable returning a dict of counter name to its current total
+    """
+    _counters[prefix] = read
+
+
+@contextmanager
+def span(name: str, channel: str = None):
+    """
+    Time a block and record it in the histogram of (name, channel).
+
+    Works with plain `with`, also around awaits:
+
+        with span("generation", self.tip_type):
+            content = await create_chat_completion(...)
+    """
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        observe(name, channel, time.perf_counter() - start, error=error)
+
+
+def snapshot(channel: str = None) -> list:
+    """
+    Summarize the recorded spans.
+
+    Args:
+        channel: Only include spans of this channel
+
+    Returns:
+        A list of dicts with name, channel, count, errors, mean, p50, p95, p99 and max in seconds
+    """
+    rows = []
+    for (name, span_channel), histogram in sorted(_histograms.items()):
+        if channel is not None and span_channel != channel:
+            continue
+        rows.append({
+            "name": name,
+            "channel": span_channel,
+            "count": histogram.count,
+            "errors": histogram.errors,
+            "mean": histogram.sum / histogram.count if histogram.count else 0.0,
+            "p50": histogram.quantile(0.5),
+            "p95": histogram.quantile(0.95),
+            "p99": histogram.quantile(0.99),
+            "max": histogram.max,
+        })
+    return rows
+
+
+def format_stats(channel: str = None) -> str:
+    """Render the span summary as a fixed-width table for chat, followed by the registered counters."""
+    rows = snapshot(channel)
+    if not rows:
+        lines = ["No timings recorded yet."]
+    else:
+        lines = [f"{'span':<18}{'channel':<12}{'n':>6}{'err':>5}{'p50':>9}{'p99':>9}{'max':>9}"]
+    for row in rows:
+        lines.append(
+            f"{row['name']:<18}{row['channel'] or '-':<12}{row['count']:>6}{row['errors']:>5}"
+            f"{_ms(row['p50']):>9}{_ms(row['p99']):>9}{_ms(row['max']):>9}"
+        )
+    for prefix, read in sorted(_counters.items()):
+        counters = ", ".join(f"{name} {value}" for name, value in read().items())
+        lines.append(f"{prefix} (all channels): {counters}")
+    return "\n".join(lines)
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}ms" if seconds < 10 else f"{seconds:.1f}s"
+
+
+def render_prometheus() -> str:
+    """Render all histograms in the Prometheus text exposition format."""
+    lines = [
+        "# HELP tips_span_seconds Duration of instrumented bot operations.",
+        "# TYPE tips_span_seconds histogram",
+    ]
+    for (name, channel), histogram in sorted(_histograms.items()):
+        labels = f'span="{name}",channel="{channel}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram.counts):
+            cumulative += count
+            lines.append(f'tips_span_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'tips_span_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f"tips_span_seconds_sum{{{labels}}} {histogram.sum}")
+        lines.append(f"tips_span_seconds_count{{{labels}}} {histogram.count}")
+    lines.append("# HELP tips_span_errors_total Instrumented operations that raised.")
+    lines.append("# TYPE tips_span_errors_total counter")
+    for (name, channel), histogram in sorted(_histograms.items()):
+        lines.append(f'tips_span_errors_total{{span="{name}",channel="{channel}"}} {histogram.errors}')
+    for prefix, read in sorted(_counters.items()):
+        for name, value in read().items():
+            metric = f"tips_{prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Drop all recorded timings."""
+    _histograms.clear()
+
+
+async def _handle_request(reader, writer):
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        path = request_line.split()[1].decode() if len(request_line.split()) > 1 else "/"
+        if path == "/metrics":
+            status, body = "200 OK", render_prometheus()
+        else:
+            status, body = "404 Not Found", "Not found\n"
+        data = body.encode()
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.warning(f"Error serving metrics request: {e}")
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """
+    Serve GET /metrics on the running event loop when a port is configured.
+
+    Returns:
+        The asyncio server, or None when METRICS_PORT is unset
+    """
+    if not port:
+        return None
+    server = await asyncio.start_server(_handle_request, host, port)
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,47 @@
+import re
+
+# Keep the guidance prompt short: a handful of one-line topics is enough to steer the model.
+MAX_TOPICS = 10
+MAX_TOPIC_LENGTH = 80
+
+_LEVEL_LINE = re.compile(r"level\s*:", re.IGNORECASE)
+_MARKUP = re.compile(r"[*_`#>~|]+")
+
+
+def tip_topic(text: str, max_length: int = MAX_TOPIC_LENGTH) -> str:
+    """
+    Return a one-line summary of a tip: its first line of prose without markup.
+
+    Tips start with a "Level: #..." line followed by the bold explanation, so the
+    level line and code fences are skipped.
+    """
+    in_code = False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            in_code = not in_code
+            continue
+        if in_code or not stripped or _LEVEL_LINE.search(stripped):
+            continue
+        topic = " ".join(_MARKUP.sub(" ", stripped).split())
+        if topic:
+            return topic if len(topic) <= max_length else topic[:max_length - 1].rstrip() + "…"
+    return ""
+
+
+def add_topics(topics: list, new_topics) -> list:
+    """Merge topics in order without duplicates, keeping the most recent MAX_TOPICS."""
+    for topic in new_topics:
+        if topic and topic not in topics:
+            topics.append(topic)
+    del topics[:-MAX_TOPICS]
+    return topics
+
+
+def guidance_message(topics: list) -> dict:
+    """Build the chat message that steers the next generation away from covered topics."""
+    covered = "\n".join(f"- {topic}" for topic in topics)
+    return {
+        "role": "user",
+        "content": f"These topics were already covered, so pick a clearly different one:\n{covered}",
+    }
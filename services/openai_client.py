@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from services.embedding_cache import embedding_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
+MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "10"))
+# Point at an OpenAI-compatible server, e.g. the local fake in benchmarks/fake_services.py.
+BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+REQUEST_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+
+_client = None
+_semaphore = None
+
+
+def get_client() -> AsyncOpenAI:
+    """Return the shared AsyncOpenAI client backed by a pooled HTTP connection."""
+    global _client
+    if _client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            logger.critical("OpenAI API key not found!")
+            raise ValueError("OpenAI API key not found in environment variables.")
+        http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+            ),
+        )
+        _client = AsyncOpenAI(api_key=api_key, base_url=BASE_URL, http_client=http_client)
+        logger.info(f"OpenAI client created (max concurrency {MAX_CONCURRENCY}, max connections {MAX_CONNECTIONS}).")
+    return _client
+
+
+def set_client(client):
+    """Use the given AsyncOpenAI-compatible client instead of creating one, e.g. in tests and benchmarks."""
+    global _client
+    _client = client
+
+
+def get_semaphore() -> asyncio.Semaphore:
+    """Return the semaphore limiting in-flight OpenAI requests."""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def create_chat_completion(model: str, messages: list) -> str:
+    """
+    Generate a chat completion through the shared client.
+
+    Args:
+        model: The chat model name
+        messages: The chat messages to send
+
+    Returns:
+        The stripped content of the first choice
+    """
+    async with get_semaphore():
+        response = await get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+        )
+    return response.choices[0].message.content.strip()
+
+
+async def stream_chat_completion(model: str, messages: list):
+    """
+    Generate a chat completion through the shared client, yielding its text as it arrives.
+
+    Args:
+        model: The chat model name
+        messages: The chat messages to send
+
+    Yields:
+        The content delta of each streamed chunk, skipping empty ones
+    """
+    async with get_semaphore():
+        stream = await get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+async def create_embeddings(texts: list, model: str = EMBEDDING_MODEL) -> list:
+    """
+    Embed several texts through the shared client, using the embedding cache.
+
+    Only texts missing from the cache are sent, in a single request.
+
+    Args:
+        texts: The texts to embed
+        model: The embedding model name
+
+    Returns:
+        A list of embeddings in the same order as texts
+    """
+    found = embedding_cache.get_many(texts, model)
+    missing = list(dict.fromkeys(text for text in texts if text not in found))
+    if missing:
+        async with get_semaphore():
+            response = await get_client().embeddings.create(model=model, input=missing)
+        fetched = {
+            missing[item.index]: item.embedding
+            for item in response.data
+        }
+        embedding_cache.put_many(fetched, model)
+        found.update(fetched)
+    return [list(found[text]) for text in texts]
+
+
+async def create_embedding(text: str, model: str = EMBEDDING_MODEL) -> list:
+    """Embed a single text through the shared client."""
+    embeddings = await create_embeddings([text], model=model)
+    return embeddings[0]
+
+
+async def close_client():
+    """Close the pooled HTTP connection, e.g. before the event loop shuts down."""
+    global _client, _semaphore
+    if _client is not None:
+        await _client.close()
+    _client = None
+    _semaphore = None
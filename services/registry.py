@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import os
+import time
+
+from services.channels import load_channels
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds a provider may sit unused before its index is dropped from memory.
+IDLE_TIMEOUT = int(os.getenv("PROVIDER_IDLE_TIMEOUT", "1800"))
+# Most indexes kept open at once; the least recently used ones are unloaded first.
+MAX_OPEN_INDEXES = int(os.getenv("MAX_OPEN_INDEXES", "16"))
+
+_channels = None
+# Providers are created on first use so that faiss, numpy and openai are only
+# loaded by processes that actually generate tips.
+_providers = {}
+_last_used = {}
+
+
+def get_channels() -> dict:
+    """Return all configured channels, reading the config file on first call."""
+    global _channels
+    if _channels is None:
+        _channels = load_channels()
+    return _channels
+
+
+def get_channel(name: str):
+    """
+    Look up a channel by name or alias.
+
+    Raises:
+        ValueError: If no channel matches
+    """
+    channels = get_channels()
+    name = name.lower()
+    if name in channels:
+        return channels[name]
+    for channel in channels.values():
+        if name in channel.aliases:
+            return channel
+    raise ValueError(f"Unknown tip type: {name}")
+
+
+def get_provider(tip_type: str):
+    """
+    Return the process-wide provider for a channel, creating it on first use.
+
+    The provider's index is loaded on first use and dropped again by
+    evict_idle_providers once the channel has been idle for a while.
+
+    Args:
+        tip_type: Channel name or alias from the channels config
+
+    Returns:
+        The shared TipsProvider instance of the channel
+    """
+    channel = get_channel(tip_type)
+    provider = _providers.get(channel.name)
+    if provider is None:
+        from services.channel_tips import ChannelTips
+
+        logger.info(f"Creating {channel.name} tips provider...")
+        provider = ChannelTips(channel)
+        _providers[channel.name] = provider
+    _last_used[channel.name] = time.monotonic()
+    _limit_open_indexes(channel.name)
+    return provider
+
+
+def _limit_open_indexes(keep: str, limit: int = MAX_OPEN_INDEXES):
+    """Unload least recently used indexes so at most limit stay open, counting the one about to be used."""
+    open_names = [name for name, provider in _providers.items() if provider.faiss_index is not None and name != keep]
+    excess = len(open_names) + 1 - limit
+    for name in sorted(open_names, key=_last_used.get)[:max(excess, 0)]:
+        if _providers[name].unload():
+            logger.info(f"Unloaded least recently used {name} index.")
+
+
+def evict_idle_providers(max_idle: float = IDLE_TIMEOUT) -> int:
+    """
+    Unload the indexes of providers not used for max_idle seconds.
+
+    Returns:
+        The number of indexes unloaded
+    """
+    now = time.monotonic()
+    evicted = 0
+    for name, provider in list(_providers.items()):
+        if now - _last_used.get(name, now) >= max_idle and provider.unload():
+            logger.info(f"Unloaded idle {name} index.")
+            evicted += 1
+    return evicted
+
+
+async def evict_worker(max_idle: float = IDLE_TIMEOUT):
+    """Periodically unload the indexes of idle channels."""
+    while True:
+        await asyncio.sleep(max(max_idle / 4, 1))
+        try:
+            evict_idle_providers(max_idle)
+        except Exception as e:
+            logger.error(f"Error unloading idle indexes: {e}")
+
+
+def reset_providers():
+    """Drop all cached providers and channels so the next lookup reloads them from disk."""
+    global _channels
+    _providers.clear()
+    _last_used.clear()
+    _channels = None
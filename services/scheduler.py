@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import os
+import random
+from datetime import datetime, timedelta
+
+from db import get_last_run, set_last_run
+
+logger = logging.getLogger(__name__)
+
+
+JITTER = float(os.getenv("SCHEDULE_JITTER", "60"))
+CATCH_UP_WINDOW = float(os.getenv("SCHEDULE_CATCH_UP_HOURS", "6"))
+# Long sleeps are split so a suspended machine or clock change is noticed quickly.
+MAX_SLEEP = 60
+
+
+class CronSchedule:
+    """
+    A standard 5-field cron expression: minute hour day-of-month month day-of-week.
+
+    Fields accept *, numbers, ranges (a-b), steps (*/n, a-b/n) and lists (a,b).
+    Day of week is 0-6 with 0 (or 7) meaning Sunday.
+    """
+
+    RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = [
+            self._parse_field(field, low, high) for field, (low, high) in zip(fields, self.RANGES)
+        ]
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse_field(field, low, high):
+        values = set()
+        for part in field.split(","):
+            part, _, step = part.partition("/")
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(value) for value in part.split("-", 1))
+            else:
+                start = end = int(part)
+            if start < low or end > high or start > end:
+                raise ValueError(f"Cron field {field!r} is out of range {low}-{high}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+
+    def _day_matches(self, moment):
+        # Like cron, when both day fields are restricted either one may match.
+        day = moment.day in self.days
+        weekday = (moment.isoweekday() % 7) in self.weekdays
+        if self.any_day:
+            return weekday
+        if self.any_weekday:
+            return day
+        return day or weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Return the first matching minute strictly after moment."""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression {self.expression!r} never matches")
+
+
+class Scheduler:
+    """
+    Runs coroutine jobs on cron schedules inside the bot's event loop.
+
+    Each job gets a random delay of up to jitter seconds, a run missed while the
+    process was down is made up once on start if it is recent enough, and a job
+    that is still running when it is due again is skipped rather than overlapped.
+    """
+
+    def __init__(self, jitter: float = JITTER, catch_up_window: float = CATCH_UP_WINDOW):
+        self.jitter = jitter
+        self.catch_up_window = timedelta(hours=catch_up_window)
+        self.jobs = []
+        self._running = {}
+
+    def add(self, name: str, expressions, job):
+        """
+        Register a job.
+
+        Args:
+            name: Unique job name, used to remember the last run
+            expressions: A cron expression or a list of them
+            job: Coroutine function called without arguments
+        """
+        if isinstance(expressions, str):
+            expressions = [expressions]
+        schedules = [CronSchedule(expression) for expression in expressions]
+        self.jobs.append((name, schedules, job))
+        logger.info(f"Scheduled {name} at {', '.join(s.expression for s in schedules)}")
+
+    @staticmethod
+    def _next_run(schedules, moment):
+        return min(schedule.next_after(moment) for schedule in schedules)
+
+    async def _execute(self, name, job):
+        task = self._running.get(name)
+        if task is not None and not task.done():
+            logger.warning(f"Skipping scheduled {name}: the previous run is still in progress.")
+            return
+        set_last_run(name, datetime.now())
+
+        async def run():
+            try:
+                logger.info(f"Running scheduled {name}...")
+                await job()
+            except Exception as e:
+                logger.error(f"Error in scheduled {name}: {e}")
+
+        self._running[name] = asyncio.create_task(run())
+
+    async def _run_job(self, name, schedules, job):
+        last_run = get_last_run(name)
+        if last_run is not None:
+            missed = self._next_run(schedules, last_run)
+            now = datetime.now()
+            if missed <= now and now - missed <= self.catch_up_window:
+                logger.info(f"Catching up on {name} missed at {missed:%Y-%m-%d %H:%M}.")
+                await self._execute(name, job)
+
+        while True:
+            due = self._next_run(schedules, datetime.now()) + timedelta(seconds=random.uniform(0, self.jitter))
+            while (remaining := (due - datetime.now()).total_seconds()) > 0:
+                await asyncio.sleep(min(remaining, MAX_SLEEP))
+            await self._execute(name, job)
+
+    async def run(self):
+        """Run all registered jobs until cancelled."""
+        await asyncio.gather(*(self._run_job(name, schedules, job) for name, schedules, job in self.jobs))
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import os
+
+import faiss
+import numpy as np
+
+from db import get_tip_details
+from services.openai_client import create_embedding
+from services.registry import get_channel, get_channels, get_provider
+
+logger = logging.getLogger(__name__)
+
+
+PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "5"))
+# Deepest hit reachable by paging; bounds the top-k asked of each index.
+MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "100"))
+
+
+async def embed_query(query: str):
+    """Embed a search query, normalized like stored tips. Repeated queries come from the embedding cache."""
+    embedding = np.array(await create_embedding(query), dtype="float32")
+    faiss.normalize_L2(embedding.reshape(1, -1))
+    return embedding
+
+
+async def search_tips(query: str, channel: str = None, page: int = 1, page_size: int = PAGE_SIZE):
+    """
+    Find the stored tips closest in meaning to a query.
+
+    Every searched channel index is queried for enough hits to fill the page, the
+    hits are merged by score, and only the page's tips are read from the database,
+    in one query.
+
+    Args:
+        query: Free text to search for
+        channel: Channel name or alias to search, or None for all channels
+        page: 1-based page number
+        page_size: Hits per page
+
+    Returns:
+        Tuple of (hits, has_more); each hit is a dict with score, id, type, text and created_at
+
+    Raises:
+        ValueError: If the channel is unknown
+    """
+    names = [get_channel(channel).name] if channel else list(get_channels())
+    k = min(page * page_size, MAX_RESULTS)
+    offset = (page - 1) * page_size
+    if offset >= k:
+        return [], False
+
+    embedding = await embed_query(query)
+    results = await asyncio.gather(
+        *(get_provider(name).search(embedding, k + 1) for name in names),
+        return_exceptions=True,
+    )
+    scored = []
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error searching the {name} index: {result}")
+            continue
+        scored.extend(result)
+    scored.sort(reverse=True)
+
+    page_hits = scored[offset:k]
+    details = get_tip_details([tip_id for _, tip_id in page_hits])
+    hits = []
+    for score, tip_id in page_hits:
+        if tip_id in details:
+            tip_type, text, created_at = details[tip_id]
+            hits.append({"score": score, "id": tip_id, "type": tip_type, "text": text, "created_at": created_at})
+    return hits, len(scored) > k and k < MAX_RESULTS
+
+
+def format_hits(hits: list, page: int, page_size: int = PAGE_SIZE, width: int = 300) -> str:
+    """Render a page of search hits as plain text, each tip cut to width characters."""
+    if not hits:
+        return "No matching tips."
+    lines = []
+    for number, hit in enumerate(hits, start=(page - 1) * page_size + 1):
+        text = " ".join(hit["text"].split())
+        if len(text) > width:
+            text = text[:width - 1] + "…"
+        created = hit["created_at"].strftime("%Y-%m-%d") if hit["created_at"] else "-"
+        lines.append(f"{number}. [{hit['type']} #{hit['id']}, {created}, {hit['score']:.3f}]\n{text}")
+    return "\n\n".join(lines)
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import os
+import time
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from services.metrics import span
+
+logger = logging.getLogger(__name__)
+
+
+# Telegram allows about 30 messages per second overall and about 20 per minute into one group or channel.
+GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", str(20 / 60)))
+CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+SEND_WORKERS = int(os.getenv("TELEGRAM_SEND_WORKERS", "8"))
+MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "5"))
+
+
+class TokenBucket:
+    """Allow rate events per second on average, with bursts of up to capacity."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def pause(self, seconds: float):
+        """Drain the bucket so the next token is available only after seconds, e.g. after RetryAfter."""
+        self._refill()
+        self.tokens = min(self.tokens, 1.0) - seconds * self.rate
+
+
+class SendResult:
+    """How many parts of a queued message were delivered, and whether sending the rest may succeed later."""
+
+    def __init__(self, delivered: int, total: int, retryable: bool = False):
+        self.delivered = delivered
+        self.total = total
+        self.retryable = retryable
+
+    def __bool__(self):
+        return self.delivered == self.total
+
+    def __repr__(self):
+        return f"SendResult(delivered={self.delivered}, total={self.total}, retryable={self.retryable})"
+
+
+def _is_parse_error(error: BadRequest) -> bool:
+    return "can't parse entities" in str(error).lower()
+
+
+class SendQueue:
+    """
+    Outbound message queue with per-chat and global rate limits.
+
+    Each job is the list of parts of one logical message; a worker sends the
+    parts in order so split messages are never interleaved.
+    """
+
+    def __init__(self, bot, workers: int = SEND_WORKERS, max_retries: int = MAX_RETRIES):
+        self.bot = bot
+        self.max_retries = max_retries
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.global_bucket = TokenBucket(GLOBAL_RATE, int(GLOBAL_RATE))
+        self.chat_buckets = {}
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(workers)]
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(CHAT_RATE, CHAT_BURST)
+        return bucket
+
+    async def send(self, chat_id, parts: list) -> SendResult:
+        """
+        Queue a message and wait until its parts are sent or sending stops at a failed one.
+
+        Args:
+            chat_id: Target chat
+            parts: List of (text, parse_mode) or (text, parse_mode, plain_text) tuples;
+                plain_text is sent without parse mode if Telegram cannot parse text
+
+        Returns:
+            A SendResult, true if every part was delivered
+        """
+        done = self.loop.create_future()
+        await self.queue.put((chat_id, parts, done))
+        return await done
+
+    async def _send_part(self, chat_id, text, parse_mode, plain_text=None):
+        try:
+            await self._send_text(chat_id, text, parse_mode)
+        except BadRequest as e:
+            if parse_mode is None or plain_text is None or not _is_parse_error(e):
+                raise
+            logger.warning(f"Telegram could not parse a message for chat {chat_id} ({e}), sending it as plain text.")
+            await self._send_text(chat_id, plain_text, None)
+
+    async def _send_text(self, chat_id, text, parse_mode):
+        bucket = self._chat_bucket(chat_id)
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            await self.global_bucket.acquire()
+            try:
+                with span("telegram_request"):
+                    await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                return
+            except RetryAfter as e:
+                logger.warning(f"Flood control for chat {chat_id}, retrying in {e.retry_after}s.")
+                bucket.pause(e.retry_after)
+            except (BadRequest, Forbidden):
+                raise
+            except NetworkError as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(2 ** attempt, 60)
+                logger.warning(f"Error sending to chat {chat_id}: {e}. Retrying in {delay}s.")
+                await asyncio.sleep(delay)
+        raise RuntimeError(f"Giving up on chat {chat_id} after {self.max_retries} retries.")
+
+    async def _worker(self):
+        while True:
+            chat_id, parts, done = await self.queue.get()
+            delivered = 0
+            try:
+                for part in parts:
+                    await self._send_part(chat_id, *part)
+                    delivered += 1
+                result = SendResult(delivered, len(parts))
+            except Exception as e:
+                logger.error(f"Error sending part {delivered + 1}/{len(parts)} of a message to chat {chat_id}: {e}")
+                # Telegram will reject a bad or forbidden message the same way next time.
+                result = SendResult(delivered, len(parts), retryable=not isinstance(e, (BadRequest, Forbidden)))
+            try:
+                if not done.done():
+                    done.set_result(result)
+            finally:
+                self.queue.task_done()
+
+    async def close(self):
+        """Wait for queued messages, then stop the workers."""
+        await self.queue.join()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import os
+
+from db import count_queued_tips, dequeue_tip, enqueue_tip
+from services.registry import get_provider
+
+logger = logging.getLogger(__name__)
+
+
+BUFFER_DEPTH = int(os.getenv("TIP_BUFFER_DEPTH", "3"))
+REFILL_INTERVAL = int(os.getenv("TIP_BUFFER_REFILL_INTERVAL", "900"))
+
+
+async def refill(tip_type: str, depth: int = BUFFER_DEPTH) -> int:
+    """
+    Generate tips until the queue of a channel holds depth entries.
+
+    Returns:
+        The number of tips added
+    """
+    added = 0
+    missing = depth - count_queued_tips(tip_type)
+    for _ in range(missing):
+        tip = await get_provider(tip_type).get_unique_tip()
+        if not tip:
+            logger.warning(f"Could not generate a {tip_type} tip for the buffer.")
+            break
+        enqueue_tip(tip_type, tip)
+        added += 1
+    if added:
+        logger.info(f"Added {added} tips to the {tip_type} buffer.")
+    return added
+
+
+async def next_tip(tip_type: str):
+    """Take the next buffered tip of a channel, generating one on the spot if the queue is empty."""
+    tip = dequeue_tip(tip_type)
+    if tip is not None:
+        logger.info(f"Using buffered {tip_type} tip.")
+        return tip
+    logger.warning(f"The {tip_type} buffer is empty. Generating a tip now.")
+    return await get_provider(tip_type).get_unique_tip()
+
+
+def requeue_tip(tip_type: str, tip: str):
+    """Put a tip that could not be sent back at the head of the buffer, to go out before newer ones."""
+    try:
+        enqueue_tip(tip_type, tip, front=True)
+    except Exception as e:
+        logger.error(f"Error requeueing {tip_type} tip: {e}")
+
+
+async def refill_worker(tip_types, depth: int = BUFFER_DEPTH, interval: int = REFILL_INTERVAL):
+    """Keep the buffers of the given channels topped up, checking every interval seconds."""
+    while True:
+        for tip_type in tip_types:
+            try:
+                await refill(tip_type, depth)
+            except Exception as e:
+                logger.error(f"Error refilling {tip_type} buffer: {e}")
+        await asyncio.sleep(interval)
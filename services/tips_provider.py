@@ -1,4 +1,3 @@
-import openai
 import os
 from dotenv import load_dotenv
 import logging
@@ -6,18 +5,50 @@ import numpy as np
 import faiss
 import asyncio
 
-from langchain_openai import OpenAIEmbeddings
 # from sklearn.metrics.pairwise import cosine_similarity
-from db import create_tip, create_similar_tip
+from db import (
+    create_tip,
+    create_similar_tip,
+    create_similar_tips,
+    get_tip_texts,
+    get_tip_positions,
+    get_tips_by_ids,
+    iter_tip_batches,
+    set_tip_embeddings,
+)
+from services.openai_client import (
+    EMBEDDING_MODEL,
+    create_chat_completion,
+    create_embedding,
+    create_embeddings,
+    stream_chat_completion,
+)
+from services.vector_log import VectorLog, write_index_atomic
+from services.index_factory import (
+    LayeredIndex,
+    configure_search,
+    create_index,
+    extract_ids,
+    extract_vectors,
+    index_encoding,
+    index_kind,
+    LOSSY_ENCODINGS,
+    migrate_index,
+    read_index_mapped,
+    with_ids,
+)
+from services.channels import CANDIDATE_SELECTIONS
+from services.lexical_filter import LexicalFilter
+from services.metrics import span
+from services.novelty import add_topics, guidance_message, tip_topic
 
 load_dotenv()
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger(__name__)
 
+# IDs given to vectors of a legacy positional index that have no Tip row.
+ORPHAN_ID_BASE = 1 << 40
+
 
 class TipsProvider:
 
@@ -28,7 +59,17 @@ class TipsProvider:
             similarity_threshold: float = 0.95, 
             max_generation_attempts: int = 5, 
             dimension: int = 1536,
-            tip_type: str = "general"
+            tip_type: str = "general",
+            compact_every: int = 100,
+            index_type: str = None,
+            parallel_candidates: int = None,
+            candidate_selection: str = None,
+            lexical_prefilter: bool = True,
+            novelty_guidance: bool = None,
+            novelty_neighbours: int = 3,
+            memory_map: bool = None,
+            encoding: str = None,
+            retry_delay: float = 1.0
         ):
         
         self.index_path = index_path
@@ -38,62 +79,339 @@ class TipsProvider:
         self.max_generation_attempts = max_generation_attempts
         self.dimension = dimension
         self.tip_type = tip_type
+        self.compact_every = compact_every
+        # Seconds to wait before generating again after a rejected or failed candidate.
+        self.retry_delay = retry_delay
+        self.index_type = index_type or os.getenv(
+            f"{tip_type.upper()}_INDEX_TYPE", os.getenv("FAISS_INDEX_TYPE", "flat")
+        )
+        self.encoding = encoding or os.getenv(
+            f"{tip_type.upper()}_FAISS_ENCODING", os.getenv("FAISS_ENCODING", "float32")
+        )
+        # Number of candidates generated concurrently per round; 1 keeps the sequential loop.
+        self.parallel_candidates = parallel_candidates or int(os.getenv(
+            f"{tip_type.upper()}_PARALLEL_CANDIDATES", os.getenv("PARALLEL_CANDIDATES", "1")
+        ))
+        # "first" takes the first novel candidate, "most_novel" the one farthest from stored tips.
+        self.candidate_selection = candidate_selection or os.getenv(
+            f"{tip_type.upper()}_CANDIDATE_SELECTION", os.getenv("CANDIDATE_SELECTION")
+        ) or "first"
+        if self.candidate_selection not in CANDIDATE_SELECTIONS:
+            raise ValueError(
+                f"Unknown candidate selection {self.candidate_selection!r}, expected one of {', '.join(CANDIDATE_SELECTIONS)}"
+            )
+        self.lexical_prefilter = lexical_prefilter
+        # After a rejection, tell the model which nearby topics are already covered.
+        if novelty_guidance is None:
+            novelty_guidance = os.getenv(
+                f"{tip_type.upper()}_NOVELTY_GUIDANCE", os.getenv("NOVELTY_GUIDANCE", "0")
+            ).lower() in ("1", "true", "yes")
+        self.novelty_guidance = novelty_guidance
+        self.novelty_neighbours = novelty_neighbours
+        self.attempt_stats = {"accepted": 0, "attempts": 0, "failed": 0}
+        # Map the saved index read-only and keep only vectors added since the last save in memory.
+        if memory_map is None:
+            memory_map = os.getenv("FAISS_MMAP", "1").lower() in ("1", "true", "yes")
+        self.memory_map = memory_map
+        # Built in a worker thread on first use and kept across index unloads.
+        self.lexical_filter = None
+        self._lexical_task = None
+        self._lexical_pending = []
+        self.vector_log = None
 
-        openai.api_key = os.getenv('OPENAI_API_KEY')
-        if not openai.api_key:
-            logger.critical("OpenAI API key not found!")
-            raise ValueError("OpenAI API key not found in environment variables.")
+        # The index is loaded on first use so that creating a provider never blocks on I/O.
+        self.faiss_index = None
+        self._load_lock = asyncio.Lock()
+        # Generations in flight; the index is never unloaded while one is running.
+        self._active = 0
+
+    async def ensure_index(self):
+        """Resolve the embedding dimension and load the FAISS index once."""
+        if self.faiss_index is not None:
+            return self.faiss_index
+        async with self._load_lock:
+            if self.faiss_index is None:
+                try:
+                    self.dimension = await self._resolve_dimension(self.dimension)
+                except Exception as e:
+                    logger.critical(f"Failed to resolve embedding dimension: {e}")
+                    raise
+                self.vector_log = VectorLog(f"{self.index_path}.log", self.dimension)
+                self.faiss_index = self._load_faiss_index(self.index_path, self.dimension)
+                self.vector_log.replay(self.faiss_index)
+                self._catch_up_from_database()
+                self._migrate_if_needed()
+                logger.info(f"TipsProvider initialized. FAISS index size: {self.faiss_index.ntotal}")
+        return self.faiss_index
+
+    def _build_lexical_filter(self):
+        """Build the MinHash index over stored texts; runs in a worker thread, it takes minutes at a million rows."""
+        lexical_filter = LexicalFilter(
+            duplicate_threshold=float(os.getenv("LEXICAL_DUPLICATE_THRESHOLD", "0.8")),
+        )
+        lexical_filter.add_many(get_tip_texts(self.tip_type))
+        return lexical_filter
+
+    async def _load_lexical_filter(self):
         try:
-            self.embedding_model = OpenAIEmbeddings()
-            test_emb = self.embedding_model.embed_query("test")
-            actual_dimension = len(test_emb)
-            if actual_dimension != dimension:
-                logger.warning(f"Provided dimension {dimension} does not match OpenAI model dimension {actual_dimension}. Using {actual_dimension}.")
-                dimension = actual_dimension
-            self.dimension = dimension
+            lexical_filter = await asyncio.to_thread(self._build_lexical_filter)
         except Exception as e:
-            logger.critical(f"Failed to initialize OpenAIEmbeddings: {e}")
-            raise
+            logger.error(f"Error building lexical pre-filter: {e}")
+            self._lexical_task = None
+            return
+        # Texts stored while the thread was reading the database.
+        lexical_filter.add_many(self._lexical_pending)
+        self._lexical_pending = []
+        self.lexical_filter = lexical_filter
+        logger.info(f"Lexical pre-filter built from {len(lexical_filter)} stored texts.")
 
-        self.faiss_index = self._load_faiss_index(self.index_path, self.dimension)
-        logger.info(f"TipsProvider initialized. FAISS index size: {self.faiss_index.ntotal}")
+    def _add_lexical_texts(self, texts):
+        if self.lexical_filter is not None:
+            self.lexical_filter.add_many(texts)
+        elif self._lexical_task is not None:
+            self._lexical_pending.extend(texts)
 
-    def _load_faiss_index(self, path, dimension):
+    def _is_lexical_duplicate(self, content):
+        """
+        Reject near-verbatim repeats of stored tips without calling the embeddings API.
+
+        The filter is built in the background on first call; until it is ready every
+        candidate goes on to the embedding check.
+        """
+        if not self.lexical_prefilter:
+            return False
+        if self.lexical_filter is None:
+            if self._lexical_task is None:
+                self._lexical_task = asyncio.create_task(self._load_lexical_filter())
+            return False
+        return self.lexical_filter.is_duplicate(content)
+
+    @property
+    def dimension_path(self):
+        return f"{self.index_path}.dim"
+
+    async def _resolve_dimension(self, dimension):
+        """
+        Read the embedding dimension cached next to the index, probing OpenAI only once per model.
+
+        The cache file holds the dimension and the embedding model it was probed with; a
+        file from another model, or from before the model was recorded, is probed again.
+        """
         try:
-            if os.path.exists(path):
-                logger.info(f"Loading FAISS index from {path}")
-                index = faiss.read_index(path)
-                if index.d != dimension:
-                     logger.warning(f"Index dimension mismatch ({index.d} != {dimension}) in {path}. Creating new index.")
-                     index = faiss.IndexFlatIP(dimension)
-                else:
-                     if not isinstance(index, faiss.IndexFlatIP):
-                         logger.warning(f"Loaded index is not IndexFlatIP. Recreating.")
-                         index = faiss.IndexFlatIP(dimension)
+            if os.path.exists(self.dimension_path):
+                with open(self.dimension_path) as f:
+                    cached_dimension, _, cached_model = f.read().strip().partition("\n")
+                cached_dimension = int(cached_dimension)
+                if cached_model.strip() == EMBEDDING_MODEL:
+                    logger.info(f"Using cached embedding dimension {cached_dimension} from {self.dimension_path}")
+                    return cached_dimension
+                if cached_model:
+                    logger.warning(f"Embedding model changed from {cached_model.strip()} to {EMBEDDING_MODEL}, probing its dimension again.")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read cached dimension from {self.dimension_path}: {e}")
 
-                logger.info(f"FAISS index loaded with {index.ntotal} vectors.")
-                return index
-            else:
-                logger.info(f"FAISS index file not found at {path}. Creating new IndexFlatIP.")
-                return faiss.IndexFlatIP(dimension)
+        test_emb = await create_embedding("test")
+        actual_dimension = len(test_emb)
+        if actual_dimension != dimension:
+            logger.warning(f"Provided dimension {dimension} does not match OpenAI model dimension {actual_dimension}. Using {actual_dimension}.")
+        try:
+            with open(self.dimension_path, "w") as f:
+                f.write(f"{actual_dimension}\n{EMBEDDING_MODEL}")
+        except OSError as e:
+            logger.warning(f"Could not cache embedding dimension to {self.dimension_path}: {e}")
+        return actual_dimension
+
+    def _new_index(self, dimension):
+        index = with_ids(create_index(self.index_type, dimension, encoding=self.encoding))
+        return LayeredIndex(index) if self.memory_map else index
+
+    def _read_index(self, path):
+        if self.memory_map:
+            return configure_search(read_index_mapped(path))
+        return faiss.read_index(path)
+
+    def _load_faiss_index(self, path, dimension):
+        if not os.path.exists(path):
+            logger.info(f"FAISS index file not found at {path}. Creating new {self.index_type} index.")
+            return self._new_index(dimension)
+        try:
+            logger.info(f"Loading FAISS index from {path}")
+            index = self._read_index(path)
         except Exception as e:
-            logger.error(f"Error loading FAISS index from {path}: {e}. Creating new index.")
-            return faiss.IndexFlatIP(dimension)
+            # Keep the unreadable file for inspection instead of overwriting it on the next save.
+            corrupt_path = f"{path}.corrupt"
+            logger.error(f"Error loading FAISS index from {path}: {e}. Moving it to {corrupt_path} and creating new index.")
+            os.replace(path, corrupt_path)
+            return self._new_index(dimension)
+
+        if index.d != dimension:
+            logger.warning(f"Index dimension mismatch ({index.d} != {dimension}) in {path}. Creating new index.")
+            return self._new_index(dimension)
+
+        if not isinstance(index, faiss.IndexIDMap):
+            index = self._convert_positional_index(index)
+            write_index_atomic(index, path)
+            self.vector_log.reset()
+            if self.memory_map:
+                index = self._read_index(path)
+
+        logger.info(f"FAISS index loaded with {index.ntotal} vectors.")
+        return LayeredIndex(index) if self.memory_map else index
+
+    def _convert_positional_index(self, index):
+        """
+        Re-key a legacy index, whose IDs were insertion positions, by Tip.id.
+
+        The vectors are also stored on their Tip rows so the index can later be rebuilt from the database.
+        """
+        logger.info(f"Converting positional index with {index.ntotal} vectors to Tip IDs...")
+        vectors = extract_vectors(index)
+        tip_ids = get_tip_positions(self.tip_type)
+        ids = np.array(
+            [tip_ids.get(position, ORPHAN_ID_BASE + position) for position in range(len(vectors))],
+            dtype="int64",
+        )
+        orphans = int((ids >= ORPHAN_ID_BASE).sum())
+        if orphans:
+            logger.warning(f"{orphans} vectors have no matching tip row. Keeping them for deduplication only.")
+        set_tip_embeddings({
+            int(tip_id): vectors[position].tobytes()
+            for position, tip_id in enumerate(ids)
+            if tip_id < ORPHAN_ID_BASE
+        })
+        converted = with_ids(create_index(index_kind(index), index.d, training_vectors=vectors))
+        if len(vectors):
+            converted.add_with_ids(vectors, ids)
+        return converted
+
+    def _catch_up_from_database(self):
+        """Add tips committed to the database whose vectors never reached the index."""
+        ids = extract_ids(self.faiss_index)
+        ids = ids[ids < ORPHAN_ID_BASE]
+        last_id = int(ids.max()) if len(ids) else 0
+        added = skipped = 0
+        for batch in iter_tip_batches(self.tip_type, after_id=last_id):
+            rows = [(tip_id, embedding) for tip_id, _, embedding in batch if embedding is not None]
+            # Rows embedded by a model with another dimension cannot go into this index.
+            stale = [tip_id for tip_id, embedding in rows if not self._fits_index(embedding)]
+            if stale:
+                skipped += len(stale)
+                rows = [(tip_id, embedding) for tip_id, embedding in rows if self._fits_index(embedding)]
+            if not rows:
+                continue
+            vectors = np.stack([np.frombuffer(embedding, dtype="float32") for _, embedding in rows])
+            self.faiss_index.add_with_ids(vectors, np.array([tip_id for tip_id, _ in rows], dtype="int64"))
+            self.vector_log.append([tip_id for tip_id, _ in rows], vectors)
+            added += len(rows)
+        if added:
+            logger.warning(f"Added {added} vectors from the database that were missing from the index.")
+        if skipped:
+            logger.warning(
+                f"Skipped {skipped} {self.tip_type} tips whose stored embeddings are not {self.dimension}-dimensional; "
+                f"run `python cli.py rebuild-index {self.tip_type}` to embed them again."
+            )
+
+    def _fits_index(self, embedding: bytes) -> bool:
+        """Whether a stored float32 embedding has the dimension of this index."""
+        return len(embedding) == 4 * self.dimension
+
+    def _migrate_if_needed(self):
+        """Convert the loaded index to the configured type and encoding, keeping vector IDs."""
+        current = index_encoding(self.faiss_index)
+        if index_kind(self.faiss_index) == self.index_type and current == self.encoding:
+            return
+        if current in LOSSY_ENCODINGS:
+            logger.warning(
+                f"{self.tip_type} index is stored as {current}; run `cli.py reencode {self.tip_type}` "
+                f"to re-encode it from the stored embeddings as {self.index_type}/{self.encoding}."
+            )
+            return
+        migrated = migrate_index(self.faiss_index, self.index_type, self.encoding)
+        if migrated is not self.faiss_index:
+            self.faiss_index = migrated
+            self._save_faiss_index()
 
     def _save_faiss_index(self):
+        """Compact the vector log into the index file, written via temp file and rename."""
         if self.faiss_index is None:
             logger.warning("Attempted to save a None index.")
             return
         try:
             logger.info(f"Saving FAISS index to {self.index_path} with {self.faiss_index.ntotal} vectors...")
-            faiss.write_index(self.faiss_index, self.index_path)
+            with span("index_save", self.tip_type):
+                write_index_atomic(self.faiss_index, self.index_path)
+            self.vector_log.reset()
+            if self.memory_map:
+                # Re-map the new file so the vectors just folded in leave the in-memory delta.
+                self.faiss_index = LayeredIndex(self._read_index(self.index_path))
             logger.info("FAISS index saved successfully.")
         except Exception as e:
             logger.error(f"Error saving FAISS index to {self.index_path}: {e}")
 
-    def get_embedding(self, text):
+    def unload(self):
+        """Compact pending log entries and drop the in-memory index; the next use reloads it."""
+        if self.faiss_index is None or self._active or self._load_lock.locked():
+            return False
+        if len(self.vector_log):
+            self._save_faiss_index()
+        self.faiss_index = None
+        return True
+
+    def _persist_embedding(self, embedding, tip_id):
+        """Append a newly added vector to the log and compact once the log grows large."""
+        self.vector_log.append([tip_id], embedding.reshape(1, -1))
+        if len(self.vector_log) >= self.compact_every:
+            self._save_faiss_index()
+            self._migrate_if_needed()
+
+    async def rebuild_index(self, batch_size: int = 1000):
+        """
+        Re-create the FAISS index from the tips table, streaming rows in batches.
+
+        Tips stored before embeddings were kept in the database, or embedded by a model
+        with another dimension, are embedded again (through the embedding cache) and
+        their vectors saved on the row.
+
+        Returns:
+            Tuple of (vectors indexed, tips re-embedded)
+        """
+        async with self._load_lock:
+            self.dimension = await self._resolve_dimension(self.dimension)
+            self.vector_log = VectorLog(f"{self.index_path}.log", self.dimension)
+            index = with_ids(create_index("flat", self.dimension))
+            reembedded = 0
+            for batch in iter_tip_batches(self.tip_type, batch_size):
+                # Embeddings from a model with another dimension are fetched again like missing ones.
+                vectors = {
+                    tip_id: embedding for tip_id, _, embedding in batch
+                    if embedding is not None and self._fits_index(embedding)
+                }
+                missing = [(tip_id, text) for tip_id, text, _ in batch if tip_id not in vectors and text]
+                if missing:
+                    embeddings = await self.get_embeddings([text for _, text in missing])
+                    if embeddings is None:
+                        raise RuntimeError(f"Could not embed {len(missing)} tips without usable stored embeddings.")
+                    fetched = {tip_id: embeddings[n].tobytes() for n, (tip_id, _) in enumerate(missing)}
+                    set_tip_embeddings(fetched)
+                    vectors.update(fetched)
+                    reembedded += len(missing)
+                if vectors:
+                    ids = np.array(sorted(vectors), dtype="int64")
+                    index.add_with_ids(
+                        np.stack([np.frombuffer(vectors[tip_id], dtype="float32") for tip_id in ids]),
+                        ids,
+                    )
+                logger.info(f"Rebuilding {self.tip_type} index: {index.ntotal} vectors so far...")
+
+            self.faiss_index = migrate_index(index, self.index_type, self.encoding)
+            self._save_faiss_index()
+            logger.info(f"Rebuilt {self.tip_type} index with {self.faiss_index.ntotal} vectors ({reembedded} re-embedded).")
+            return self.faiss_index.ntotal, reembedded
+
+    async def get_embedding(self, text):
         try:
-            embedding = self.embedding_model.embed_query(text)
+            with span("embedding", self.tip_type):
+                embedding = await create_embedding(text)
             embedding_np = np.array(embedding).astype('float32')
             faiss.normalize_L2(embedding_np.reshape(1, -1))
             return embedding_np
@@ -101,6 +419,60 @@ class TipsProvider:
             logger.error(f"Error generating embedding: {e}")
             return None
 
+    async def get_embeddings(self, texts):
+        """Embed several texts in one request. Returns a normalized (n, d) array or None."""
+        try:
+            with span("embedding", self.tip_type):
+                embeddings = await create_embeddings(texts)
+            embeddings_np = np.array(embeddings).astype('float32')
+            faiss.normalize_L2(embeddings_np)
+            return embeddings_np
+        except Exception as e:
+            logger.error(f"Error generating embeddings: {e}")
+            return None
+
+    def nearest_matches(self, embeddings):
+        """
+        Find the closest stored tip for each embedding.
+
+        Args:
+            embeddings: Normalized array of shape (n, d)
+
+        Returns:
+            Tuple of (scores, tip_ids); score is -1 and tip ID None when the index is empty
+        """
+        if self.faiss_index.ntotal == 0:
+            return [-1.0] * len(embeddings), [None] * len(embeddings)
+        with span("search", self.tip_type):
+            distances, indices = self.faiss_index.search(embeddings, 1)
+        return [float(d) for d in distances[:, 0]], [int(i) for i in indices[:, 0]]
+
+    async def search(self, query_embedding, k):
+        """
+        Find the k stored tips closest to a query.
+
+        The search runs on the event loop: storing a tip and saving the index mutate it
+        there too, and a search in a worker thread could overlap them.
+
+        Args:
+            query_embedding: Normalized embedding of shape (d,)
+            k: Number of hits
+
+        Returns:
+            A list of (score, tip_id) pairs, best first, without vectors that have no Tip row
+        """
+        await self.ensure_index()
+        k = min(k, self.faiss_index.ntotal)
+        if k <= 0:
+            return []
+        with span("archive_search", self.tip_type):
+            distances, indices = self.faiss_index.search(query_embedding.reshape(1, -1), k)
+        return [
+            (float(score), int(tip_id))
+            for score, tip_id in zip(distances[0], indices[0])
+            if 0 <= tip_id < ORPHAN_ID_BASE
+        ]
+
     def is_tip_similar(self, new_tip_embedding, threshold):
         """Checks similarity using FAISS index search."""
         if self.faiss_index.ntotal == 0:
@@ -111,9 +483,9 @@ class TipsProvider:
              return False
 
         try:
-            distances, indices = self.faiss_index.search(new_tip_embedding.reshape(1, -1), 1)
+            scores, _ = self.nearest_matches(new_tip_embedding.reshape(1, -1))
 
-            similarity_score = distances[0][0]
+            similarity_score = scores[0]
             logger.debug(f"Highest similarity score found: {similarity_score:.4f}")
 
             if similarity_score >= threshold:
@@ -124,74 +496,264 @@ class TipsProvider:
             logger.error(f"Error searching FAISS index: {e}")
             return False
 
-    async def get_new_tip_content(self):
+    def build_messages(self):
+        """Return the chat messages of one tip request. Subclasses vary them per request."""
+        return self.model_messages
+
+    async def get_new_tip_content(self, covered_topics=None):
         try:
+            messages = self.build_messages()
+            if covered_topics:
+                messages = messages + [guidance_message(covered_topics)]
             logger.info(f"Requesting tip from OpenAI...")
-            response = await asyncio.to_thread(
-                openai.chat.completions.create,
-                model=self.model,
-                messages=self.model_messages,
-            )
-            tip_content = response.choices[0].message.content.strip()
+            with span("generation", self.tip_type):
+                tip_content = await create_chat_completion(self.model, messages)
             logger.info(f"Received tip content from OpenAI (length: {len(tip_content)}).")
             return tip_content
         except Exception as e:
             logger.error(f"Error generating tip content: {e}")
             return None
 
+    async def stream_tip_content(self):
+        """Yield the text of one new tip piece by piece as OpenAI generates it."""
+        logger.info(f"Streaming tip from OpenAI...")
+        with span("generation", self.tip_type):
+            async for delta in stream_chat_completion(self.model, self.build_messages()):
+                yield delta
+
+    async def check_tip(self, content):
+        """
+        Run the duplicate checks on one generated tip and store it as unique or similar.
+
+        Unlike get_unique_tip it never regenerates, so a streamed tip can be judged as shown.
+
+        Returns:
+            Tuple of (verdict, similarity score or None, ID of the closest stored tip or None).
+            The verdict is "stored" for a unique tip now in the archive, "not_stored" for a
+            unique tip whose database write failed, "duplicate" or "repeat" for a tip too
+            close to a stored one by embedding or by wording, and "unchecked" when the
+            tip could not be embedded and was neither judged nor stored.
+        """
+        self._active += 1
+        try:
+            await self.ensure_index()
+            if self._is_lexical_duplicate(content):
+                self._store_similar_tip(content, None)
+                self._record_attempts(1, accepted=False)
+                return "repeat", None, None
+
+            embedding = await self.get_embedding(content)
+            if embedding is None:
+                return "unchecked", None, None
+
+            scores, tip_ids = self.nearest_matches(embedding.reshape(1, -1))
+            if scores[0] < self.similarity_threshold:
+                if self._store_unique_tip(content, embedding, attempts=1) is None:
+                    return "not_stored", scores[0], tip_ids[0]
+                self._record_attempts(1)
+                return "stored", scores[0], tip_ids[0]
+            self._store_similar_tip(content, tip_ids[0])
+            self._record_attempts(1, accepted=False)
+            return "duplicate", scores[0], tip_ids[0]
+        finally:
+            self._active -= 1
+
+    def _covered_topics(self, content, embedding=None):
+        """
+        Summarize a rejected candidate and, given its embedding, the stored tips nearest to it.
+
+        Returns:
+            A list of one-line topics, empty unless novelty guidance is on
+        """
+        if not self.novelty_guidance:
+            return []
+        topics = [tip_topic(content)]
+        if embedding is not None and self.faiss_index.ntotal:
+            try:
+                k = min(self.novelty_neighbours, self.faiss_index.ntotal)
+                _, indices = self.faiss_index.search(embedding.reshape(1, -1), k)
+                texts = get_tips_by_ids([int(i) for i in indices[0] if i >= 0])
+                topics += [tip_topic(texts[int(i)]) for i in indices[0] if int(i) in texts]
+            except Exception as e:
+                logger.error(f"Error looking up covered topics: {e}")
+        return topics
+
+    def _record_attempts(self, attempts, accepted=True):
+        """Track how many generations each delivered tip cost."""
+        self.attempt_stats["attempts"] += attempts
+        self.attempt_stats["accepted" if accepted else "failed"] += 1
+        finished = self.attempt_stats["accepted"] + self.attempt_stats["failed"]
+        average = self.attempt_stats["attempts"] / finished
+        if accepted:
+            logger.info(f"Accepted {self.tip_type} tip after {attempts} attempts (average {average:.2f} over {finished} tips).")
+
+    def _store_unique_tip(self, content, embedding, attempts=None):
+        """
+        Store an accepted tip in the database and then in the FAISS index.
+
+        The database row, which also holds the embedding, is the commit point: if the
+        process dies before the vector reaches the index, the next load adds it back.
+
+        Returns:
+            The ID of the new Tip row, or None if it could not be stored
+        """
+        try:
+            with span("db_write", self.tip_type):
+                stored_tip = create_tip(
+                    faiss_index=None,
+                    tip_type=self.tip_type,
+                    text=content,
+                    embedding=embedding.astype('float32').tobytes(),
+                    attempts=attempts
+                )
+            logger.info(f"Stored new tip in database with ID: {stored_tip.id}")
+        except Exception as e:
+            logger.error(f"Error storing tip, not adding it to the FAISS index: {e}")
+            return None
+
+        try:
+            self.faiss_index.add_with_ids(embedding.reshape(1, -1), np.array([stored_tip.id], dtype="int64"))
+            logger.info(f"Added unique tip embedding to FAISS. Index size now {self.faiss_index.ntotal}")
+            self._persist_embedding(embedding, stored_tip.id)
+            self._add_lexical_texts([content])
+        except Exception as e:
+             logger.error(f"Error adding embedding to FAISS index: {e}")
+        return stored_tip.id
+
+    def _store_similar_tip(self, content, matched_index):
+        """Store a rejected candidate together with the ID of the stored tip it matched."""
+        try:
+            with span("db_write", self.tip_type):
+                stored_similar_tip = create_similar_tip(
+                    faiss_index=matched_index,
+                    tip_type=self.tip_type,
+                    text=content
+                )
+            logger.info(f"Stored similar tip in database with ID: {stored_similar_tip.id}")
+            self._add_lexical_texts([content])
+        except Exception as e:
+            logger.error(f"Error storing similar tip: {e}")
+
+    def _store_similar_tips(self, rejected):
+        """Store several rejected candidates, given as (content, matched_index) pairs, in one transaction."""
+        try:
+            with span("db_write", self.tip_type):
+                stored = create_similar_tips([(matched_index, self.tip_type, content) for content, matched_index in rejected])
+            logger.info(f"Stored {stored} similar tips in database.")
+            self._add_lexical_texts([content for content, _ in rejected])
+        except Exception as e:
+            logger.error(f"Error storing similar tips: {e}")
+
     async def get_unique_tip(self):
+        """
+        Generate a tip that clears the similarity threshold and store it.
+
+        Returns:
+            The accepted tip, or None if every attempt was a duplicate or its novelty could not be checked
+        """
+        self._active += 1
+        try:
+            with span("unique_tip", self.tip_type):
+                return await self._get_unique_tip()
+        finally:
+            self._active -= 1
+
+    async def _get_unique_tip(self):
+        await self.ensure_index()
+        if self.parallel_candidates > 1:
+            return await self._get_unique_tip_parallel()
+
+        covered_topics = []
         for attempt in range(self.max_generation_attempts):
             logger.info(f"Attempt {attempt + 1}/{self.max_generation_attempts} to generate a unique tip...")
-            new_tip_content = await self.get_new_tip_content()
+            new_tip_content = await self.get_new_tip_content(covered_topics)
 
             if not new_tip_content:
                 logger.warning("Failed to generate tip content. Retrying after delay...")
-                await asyncio.sleep(2)
+                await asyncio.sleep(2 * self.retry_delay)
+                continue
+
+            if self._is_lexical_duplicate(new_tip_content):
+                logger.warning("Duplicate tip detected by the lexical pre-filter, fetching a new one...")
+                self._store_similar_tip(new_tip_content, None)
+                add_topics(covered_topics, self._covered_topics(new_tip_content))
+                await asyncio.sleep(self.retry_delay)
                 continue
 
-            new_tip_embedding = self.get_embedding(new_tip_content)
+            new_tip_embedding = await self.get_embedding(new_tip_content)
 
             if new_tip_embedding is None:
-                 logger.warning("Failed to generate embedding for the tip. Skipping similarity check for this one.")
-                 return new_tip_content
+                logger.error("Failed to generate embedding for the tip, so its novelty cannot be checked.")
+                self._record_attempts(attempt + 1, accepted=False)
+                return None
 
-            if not self.is_tip_similar(new_tip_embedding, self.similarity_threshold):
+            scores, tip_ids = self.nearest_matches(new_tip_embedding.reshape(1, -1))
+            if scores[0] < self.similarity_threshold:
                 logger.info("Generated tip is unique.")
-                try:
-                    if self.faiss_index is not None:
-                        new_index = self.faiss_index.ntotal
-                        self.faiss_index.add(new_tip_embedding.reshape(1, -1))
-                        logger.info(f"Added unique tip embedding to FAISS. Index size now {new_index+1}")
-                        self._save_faiss_index()
-                        
-                        # Store the tip in the database
-                        stored_tip = create_tip(
-                            faiss_index=new_index,
-                            tip_type=self.tip_type,
-                            text=new_tip_content
-                        )
-                        logger.info(f"Stored new tip in database with ID: {stored_tip.id}")
-                    else:
-                        logger.error("FAISS index is None, cannot add embedding.")
-
-                except Exception as e:
-                     logger.error(f"Error adding embedding to FAISS index or storing tip: {e}")
-
+                self._store_unique_tip(new_tip_content, new_tip_embedding, attempts=attempt + 1)
+                self._record_attempts(attempt + 1)
                 return new_tip_content
             else:
-                logger.warning("Duplicate tip detected based on embedding similarity, fetching a new one...")
-                # Store the similar tip in the SimilarTip table
-                try:
-                    stored_similar_tip = create_similar_tip(
-                        faiss_index=new_index,
-                        tip_type=self.tip_type,
-                        text=new_tip_content
-                    )
-                    logger.info(f"Stored similar tip in database with ID: {stored_similar_tip.id}")
-                except Exception as e:
-                    logger.error(f"Error storing similar tip: {e}")
-                
-                await asyncio.sleep(1)
+                logger.warning(f"Duplicate tip detected based on embedding similarity ({scores[0]:.4f}), fetching a new one...")
+                self._store_similar_tip(new_tip_content, tip_ids[0])
+                add_topics(covered_topics, self._covered_topics(new_tip_content, new_tip_embedding))
+                await asyncio.sleep(self.retry_delay)
+
+        logger.error(f"Failed to find a unique tip after {self.max_generation_attempts} attempts.")
+        self._record_attempts(self.max_generation_attempts, accepted=False)
+        return None
+
+    async def _get_unique_tip_parallel(self):
+        """Generate candidates in concurrent rounds and keep one that clears the threshold."""
+        covered_topics = []
+        attempt = 0
+        while attempt < self.max_generation_attempts:
+            width = min(self.parallel_candidates, self.max_generation_attempts - attempt)
+            logger.info(f"Attempts {attempt + 1}-{attempt + width}/{self.max_generation_attempts}: generating {width} candidates concurrently...")
+            attempt += width
+
+            results = await asyncio.gather(*(self.get_new_tip_content(covered_topics) for _ in range(width)))
+            candidates = [content for content in results if content]
+            if not candidates:
+                logger.warning("Failed to generate tip content. Retrying after delay...")
+                await asyncio.sleep(2 * self.retry_delay)
+                continue
+
+            rejected = [(content, None) for content in candidates if self._is_lexical_duplicate(content)]
+            candidates = [content for content in candidates if (content, None) not in rejected]
+            for content, _ in rejected:
+                add_topics(covered_topics, self._covered_topics(content))
+            if not candidates:
+                self._store_similar_tips(rejected)
+                logger.warning("All candidates were rejected by the lexical pre-filter, generating another round...")
+                continue
+
+            embeddings = await self.get_embeddings(candidates)
+            if embeddings is None:
+                logger.error("Failed to generate embeddings for the candidates, so their novelty cannot be checked.")
+                self._store_similar_tips(rejected)
+                self._record_attempts(attempt, accepted=False)
+                return None
+
+            scores, tip_ids = self.nearest_matches(embeddings)
+            novel = [i for i, score in enumerate(scores) if score < self.similarity_threshold]
+            rejected += [(candidates[i], tip_ids[i]) for i in range(len(candidates)) if i not in novel]
+            self._store_similar_tips(rejected)
+
+            if novel:
+                if self.candidate_selection == "most_novel":
+                    chosen = min(novel, key=lambda i: scores[i])
+                else:
+                    chosen = novel[0]
+                logger.info(f"Picked candidate {chosen + 1}/{len(candidates)} with similarity {scores[chosen]:.4f}.")
+                self._store_unique_tip(candidates[chosen], embeddings[chosen], attempts=attempt)
+                self._record_attempts(attempt)
+                return candidates[chosen]
+
+            for i in range(len(candidates)):
+                add_topics(covered_topics, self._covered_topics(candidates[i], embeddings[i]))
+            logger.warning(f"All {len(candidates)} candidates were duplicates, generating another round...")
 
         logger.error(f"Failed to find a unique tip after {self.max_generation_attempts} attempts.")
-        return new_tip_content
\ No newline at end of file
+        self._record_attempts(self.max_generation_attempts, accepted=False)
+        return None
@@ -0,0 +1,105 @@
+import logging
+import os
+import struct
+
+import faiss
+import numpy as np
+
+from services.index_factory import extract_ids, materialize
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b"TIPVLOG2"
+HEADER = struct.Struct("<8si")  # magic, dimension
+
+
+class VectorLog:
+    """
+    Append-only log of (Tip.id, vector) records added to an ID-mapped FAISS
+    index since its last save.
+
+    Replay skips IDs the index already holds, so replaying after an
+    interrupted compaction never adds a vector twice.
+    """
+
+    def __init__(self, path: str, dimension: int):
+        self.path = path
+        self.dimension = dimension
+        self.record_dtype = np.dtype([("id", "<i8"), ("vector", "<f4", (dimension,))])
+
+    def _read_header(self, f):
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return False
+        magic, dimension = HEADER.unpack(header)
+        if magic != MAGIC:
+            logger.warning(f"Vector log {self.path} has an unknown format. Ignoring it.")
+            return False
+        if dimension != self.dimension:
+            logger.warning(f"Vector log {self.path} has dimension {dimension}, expected {self.dimension}. Ignoring it.")
+            return False
+        return True
+
+    def __len__(self):
+        if not os.path.exists(self.path):
+            return 0
+        size = os.path.getsize(self.path) - HEADER.size
+        return max(size, 0) // self.record_dtype.itemsize
+
+    def reset(self):
+        """Start an empty log."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, self.dimension))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def append(self, ids, vectors: np.ndarray):
+        """
+        Append vectors to the log.
+
+        Args:
+            ids: External IDs of the vectors
+            vectors: float32 array of shape (n, dimension)
+        """
+        if not os.path.exists(self.path):
+            self.reset()
+        records = np.empty(len(ids), dtype=self.record_dtype)
+        records["id"] = ids
+        records["vector"] = vectors
+        with open(self.path, "ab") as f:
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def replay(self, index):
+        """Add logged vectors whose IDs are not yet in the index. Returns the number added."""
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, "rb") as f:
+            if not self._read_header(f):
+                return 0
+            data = f.read()
+        # A crash during append may leave a partial trailing record; drop it.
+        usable = len(data) - len(data) % self.record_dtype.itemsize
+        records = np.frombuffer(data[:usable], dtype=self.record_dtype)
+        known = set(extract_ids(index).tolist())
+        pending = np.array([i not in known for i in records["id"].tolist()], dtype=bool)
+        if pending.any():
+            index.add_with_ids(
+                np.ascontiguousarray(records["vector"][pending]),
+                np.ascontiguousarray(records["id"][pending]),
+            )
+            logger.info(f"Replayed {int(pending.sum())} vectors from {self.path}.")
+        return int(pending.sum())
+
+
+def write_index_atomic(index, path: str):
+    """Write a FAISS index to a temporary file and rename it over path."""
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(materialize(index), tmp_path)
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)